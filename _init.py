@@ -1,21 +1,20 @@
+import argparse
 from database.mongo import init_db_structure, check_mongo_structure
-from ultraprint.logging import logger
-from ultraconfiguration import UltraConfig
+from utilities.settings import config, get_logger
 
 #! Initialize ---------------------------------------------------------------
-config = UltraConfig('config.json')
-log = logger('init_log', 
-            filename='debug/init.log', 
-            include_extra_info=config.get("logging.include_extra_info", False), 
-            write_to_file=config.get("logging.write_to_file", False))
+log = get_logger('init_log', 'debug/init.log')
 
-def init():
+def init(drop_extra_indexes=False):
     log.info("Initializing MongoDB structure...")
-    init_db_structure()
+    init_db_structure(drop_extra_indexes=drop_extra_indexes)
     if check_mongo_structure(verbose=True):
         log.success("MongoDB structure initialized successfully.")
     else:
         log.error("MongoDB structure initialization has issues.")
 
 if __name__ == "__main__":
-    init()
+    parser = argparse.ArgumentParser(description="Initialize MongoDB collections and indexes")
+    parser.add_argument("--drop-extra-indexes", action="store_true", help="Drop indexes not declared in config.json")
+    args = parser.parse_args()
+    init(drop_extra_indexes=args.drop_extra_indexes)
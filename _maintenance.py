@@ -0,0 +1,60 @@
+import argparse
+from datetime import datetime, timezone, timedelta
+from database.mongo import get_client, ensure_indexes, get_required_indexes
+from errors.error_logger import rotate_csv, CSV_FILE_PATH
+from utilities.settings import config, get_logger
+
+#! Initialize ---------------------------------------------------------------
+log = get_logger('maintenance_log', 'debug/maintenance.log')
+
+BATCH_SIZE = 1000
+
+def error_ttl_seconds():
+    """expireAfterSeconds of the TTL index declared for logs.error, if any."""
+    for spec in get_required_indexes().get("logs", {}).get("error", []):
+        ttl = spec.get("options", {}).get("expireAfterSeconds")
+        if ttl is not None:
+            return ttl
+    return None
+
+def purge_errors(days):
+    """Delete logs.error entries older than `days`, in batches to keep each delete short."""
+    collection = get_client().logs.error
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    deleted = 0
+    while True:
+        ids = [doc["_id"] for doc in collection.find({"timestamp": {"$lt": cutoff}}, {"_id": 1}).limit(BATCH_SIZE)]
+        if not ids:
+            break
+        deleted += collection.delete_many({"_id": {"$in": ids}}).deleted_count
+    log.success(f"Purged {deleted} error log entries older than {days} days")
+    return deleted
+
+def compact_errors():
+    """Release the disk space freed by purged entries back to the OS."""
+    try:
+        get_client().logs.command("compact", "error")
+        log.success("Compacted logs.error")
+    except Exception as e:
+        log.warning(f"Could not compact logs.error: {e}")
+
+def maintain(purge_days=None, compact=True, rotate=True):
+    log.info("Applying retention indexes...")
+    ensure_indexes()
+    if purge_days is None:
+        ttl = error_ttl_seconds()
+        purge_days = ttl / 86400 if ttl is not None else None
+    if purge_days is not None:
+        purge_errors(purge_days)
+    if compact:
+        compact_errors()
+    if rotate and rotate_csv():
+        log.success(f"Rotated and compressed {CSV_FILE_PATH}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply retention to logs.error and the error CSV log")
+    parser.add_argument("--purge-days", type=float, default=None, help="Delete error entries older than this (defaults to the logs.error TTL)")
+    parser.add_argument("--no-compact", action="store_true", help="Skip compacting logs.error after purging")
+    parser.add_argument("--no-rotate", action="store_true", help="Skip rotating debug/error_log.csv")
+    args = parser.parse_args()
+    maintain(purge_days=args.purge_days, compact=not args.no_compact, rotate=not args.no_rotate)
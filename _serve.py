@@ -0,0 +1,64 @@
+import argparse
+import os
+import uvicorn
+from keys.keys import environment
+from utilities.settings import config, get_logger
+from utilities.metrics import MULTIPROCESS_DIR_ENV
+
+#! Initialize ---------------------------------------------------------------
+log = get_logger('serve_log', 'debug/serve.log')
+
+def worker_count(workers):
+    """Resolve the configured worker count; 0 means one per CPU core."""
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+def prepare_metrics_dir(workers):
+    """
+    Give several workers a shared, empty directory for metric snapshots, so
+    /metrics reports the whole server whichever worker answers the scrape.
+    The workers inherit its path through the environment.
+    """
+    if workers < 2 or not config.get("metrics.enabled", True):
+        return
+    directory = os.path.abspath(config.get("metrics.multiprocess_dir", "cache/metrics"))
+    os.makedirs(directory, exist_ok=True)
+    # Snapshots of a previous run would be added to this one's totals
+    for name in os.listdir(directory):
+        if name.endswith((".json", ".tmp")):
+            os.remove(os.path.join(directory, name))
+    os.environ[MULTIPROCESS_DIR_ENV] = directory
+
+def serve(host=None, port=None, workers=None):
+    """
+    Run the API under uvicorn with the production settings from config.json.
+    The app is given as an import string, so each worker process imports it
+    (and starts its own Mongo, AIML and S3 clients) after the fork.
+    """
+    workers = worker_count(config.get("server.workers", 0) if workers is None else workers)
+    prepare_metrics_dir(workers)
+    settings = {
+        "host": host or config.get("server.host", "0.0.0.0"),
+        "port": port or config.get("server.port", 9000),
+        "workers": workers,
+        # "auto" picks uvloop and httptools when installed
+        "loop": config.get("server.loop", "auto"),
+        "http": config.get("server.http", "auto"),
+        "backlog": config.get("server.backlog", 2048),
+        "timeout_keep_alive": config.get("server.timeout_keep_alive", 5),
+        # In-flight requests, including open chat streams, get this long to finish on shutdown
+        "timeout_graceful_shutdown": config.get("server.timeout_graceful_shutdown", 30),
+        "limit_concurrency": config.get("server.limit_concurrency", None),
+        "proxy_headers": config.get("server.proxy_headers", True),
+        "forwarded_allow_ips": config.get("server.forwarded_allow_ips", "*"),
+        "access_log": config.get("server.access_log", False),
+    }
+    log.info(f"Starting {environment} server: " + ", ".join(f"{name}={value}" for name, value in settings.items()))
+    uvicorn.run("_server:app", **settings)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the API with the production server settings")
+    parser.add_argument("--host", help="Override server.host")
+    parser.add_argument("--port", type=int, help="Override server.port")
+    parser.add_argument("--workers", type=int, help="Override server.workers (0 = one per CPU core)")
+    args = parser.parse_args()
+    serve(host=args.host, port=args.port, workers=args.workers)
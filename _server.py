@@ -1,14 +1,85 @@
+from utilities.startup import mark_phase, report_startup, warm_up
 from fastapi import FastAPI, Request, Depends
+from fastapi.responses import PlainTextResponse
+import asyncio
 from fastapi.middleware.cors import CORSMiddleware
 from database.mongo import pingtest as mongo_pingtest
 from datetime import datetime, timezone
 from errors.error_logger import log_exception_with_request
 import uvicorn
-from routers import agent_route, chat_route, session_route, file_route
+from routers import agent_route, chat_route, session_route, file_route, dashboard_route, task_route
 from dependencies.auth import get_current_user  # Add this import
-from keys.keys import environment
+from keys.keys import environment, profiling_token
+from middleware.metrics import MetricsMiddleware
+from middleware.server_timing import ServerTimingMiddleware
+from utilities.metrics import render_metrics, preregister_routes, multiprocess_dir, SnapshotWriter
+from middleware.loop_monitor import LoopMonitorMiddleware
+from middleware.profiling import ProfilingMiddleware
+from middleware.compression import CompressionMiddleware
+from middleware.etag import ETagMiddleware
+from utilities.loop_monitor import LoopMonitor
+from utilities.health import HealthProber
+from utilities.agent_index import agent_index_refresher
+from utilities.task_queue import task_queue
+from utilities.job_watcher import job_watcher
+from utilities.settings import config
+from contextlib import asynccontextmanager
+from utilities.json_encoder import MongoJSONResponse
+from utilities.forward import close_http_client
+from database.mongo import close_client as close_mongo_client
 
-app = FastAPI()
+mark_phase("imports")
+
+loop_monitor = LoopMonitor(
+    interval_ms=config.get("loop_monitor.interval_ms", 100),
+    window=config.get("loop_monitor.window", 600),
+    debug=config.get("loop_monitor.debug", False),
+    block_threshold_ms=config.get("loop_monitor.block_threshold_ms", 100)
+)
+
+metrics_snapshots = SnapshotWriter(interval_s=config.get("metrics.snapshot_interval_s", 5))
+
+health_prober = HealthProber(
+    interval_s=config.get("health.interval_s", 10),
+    timeout_s=config.get("health.timeout_s", 5),
+    required=config.get("health.required", ["mongo", "aiml"])
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Mongo, JWKS, S3 and the AIML client are created per worker, here when
+    # warm-up is on and otherwise on first use
+    mark_phase("server")
+    if config.get("metrics.enabled", True):
+        # Every route is defined by now, including those added after the metrics setup
+        preregister_routes(app.routes)
+        if multiprocess_dir():
+            metrics_snapshots.start()
+    if config.get("server.warm_up", True):
+        await warm_up()
+        mark_phase("warm_up")
+    if config.get("loop_monitor.enabled", True):
+        loop_monitor.start()
+    if config.get("health.enabled", True):
+        health_prober.start()
+    if config.get("agent_index.enabled", True):
+        agent_index_refresher.start()
+    if config.get("tasks.enabled", True):
+        task_queue.start()
+    mark_phase("lifespan")
+    report_startup()
+    yield
+    await task_queue.stop(timeout=config.get("tasks.shutdown_timeout_s", 10))
+    await job_watcher.stop()
+    await agent_index_refresher.stop()
+    await health_prober.stop()
+    await loop_monitor.stop()
+    if config.get("metrics.enabled", True) and multiprocess_dir():
+        await metrics_snapshots.stop()
+    await close_http_client()
+    close_mongo_client()
+
+app = FastAPI(lifespan=lifespan, default_response_class=MongoJSONResponse)
 
 # CORS configuration
 app.add_middleware(
@@ -24,6 +95,57 @@ app.include_router(agent_route.router, prefix="/agents", tags=["agent"])
 app.include_router(chat_route.router, prefix="/chat", tags=["chat"])
 app.include_router(session_route.router, prefix="/sessions", tags=["session"])
 app.include_router(file_route.router, prefix="/files", tags=["files"])
+app.include_router(dashboard_route.router, prefix="/dashboard", tags=["dashboard"])
+app.include_router(task_route.router, prefix="/tasks", tags=["tasks"])
+
+# ETags: conditional GET for endpoints that clients poll
+if config.get("etag.enabled", True):
+    app.add_middleware(
+        ETagMiddleware,
+        routes=config.get("etag.routes", []),
+        max_age=config.get("etag.max_age", 0),
+        max_body_size=config.get("etag.max_body_size", 1048576)
+    )
+
+# Compression: gzip, plus brotli/zstd when installed; event streams are left alone
+if config.get("compression.enabled", True):
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=config.get("compression.minimum_size", 1024),
+        content_types=config.get("compression.content_types", ["application/json", "text/plain"]),
+        gzip_level=config.get("compression.gzip_level", 6),
+        brotli_quality=config.get("compression.brotli_quality", 4),
+        zstd_level=config.get("compression.zstd_level", 3)
+    )
+
+# Profiling: opt-in sampling profiler, selected by X-Profile header or sampling rate
+if config.get("profiling.enabled", False):
+    app.add_middleware(
+        ProfilingMiddleware,
+        token=profiling_token,
+        sample_rate=config.get("profiling.sample_rate", 0.0),
+        interval_ms=config.get("profiling.interval_ms", 5),
+        max_concurrent=config.get("profiling.max_concurrent", 2)
+    )
+
+# Server-Timing: per-request span breakdown, with slow requests logged
+if config.get("timing.enabled", True):
+    app.add_middleware(ServerTimingMiddleware, slow_request_ms=config.get("timing.slow_request_ms", 1000))
+
+# Loop monitor debug mode: attribute event loop stalls to the route holding the loop
+if config.get("loop_monitor.enabled", True) and config.get("loop_monitor.debug", False):
+    app.add_middleware(LoopMonitorMiddleware, monitor=loop_monitor)
+
+# Metrics: per-route latency histograms, exposed in Prometheus text format
+if config.get("metrics.enabled", True):
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        # Multiprocess mode reads every worker's snapshot file
+        return PlainTextResponse(await asyncio.to_thread(render_metrics), media_type="text/plain; version=0.0.4")
+
+mark_phase("app")
 
 @app.get("/protected")
 async def protected_route(
@@ -32,16 +154,37 @@ async def protected_route(
     user_id = user.get("sub")
     return {"message": f"Hello, {user_id}"}
 
+@app.get("/health/live")
+async def health_live():
+    """Liveness: the worker's event loop is answering. Does no I/O."""
+    return {"status": "alive", "time": datetime.now(timezone.utc).isoformat()}
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness from the background prober's cached dependency state."""
+    ready = health_prober.is_ready()
+    return MongoJSONResponse({
+        "status": "ready" if ready else "not ready",
+        "fresh": health_prober.is_fresh(),
+        "required": list(health_prober.required),
+        "dependencies": health_prober.state
+    }, status_code=200 if ready else 503)
+
 @app.get("/status")
 @app.get("/")
 async def status(request: Request):
     try:
-        mongo_status = "up" if mongo_pingtest() else "down"
+        if config.get("health.enabled", True):
+            mongo_status = health_prober.status_of("mongo")
+        else:
+            mongo_status = "up" if await asyncio.to_thread(mongo_pingtest) else "down"
         return {
             "message": "Service status retrieved successfully. All systems are operational. If you encounter any issues, please contact Ranit at https://github.com/Kawai-Senpai",
             "server": "API",
             "time": datetime.now(timezone.utc).isoformat() + "Z",
             "mongodb": mongo_status,
+            "aiml": health_prober.status_of("aiml"),
+            "s3": health_prober.status_of("s3"),
         }
     except Exception as e:
         log_exception_with_request(e, status, request)
@@ -0,0 +1,13 @@
+"""
+The API application wired to the in-memory Mongo substitute. Every uvicorn
+worker imports this module, so each gets its own patched client.
+
+    uvicorn benchmark.api:app --port 19000
+"""
+import database.mongo
+from benchmark.stubs import FakeMongoClient
+
+# Preset the lazily created client so nothing ever connects to a real Mongo
+database.mongo.client = FakeMongoClient()
+
+from _server import app  # noqa: E402
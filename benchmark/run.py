@@ -0,0 +1,235 @@
+"""
+Offline benchmark harness. Starts the local stand-ins and the API, drives
+load against each router and reports RPS, latency percentiles and API memory.
+
+    python -m benchmark.run --duration 10 --concurrency 32
+    python -m benchmark.run --json results.json
+    python -m benchmark.run --baseline results.json --tolerance 0.15
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+import jwt
+import psutil
+from jwcrypto import jwk
+from benchmark.stubs import (
+    USER_ID, ISSUER, KEY_ID, AGENT_ID, STANDALONE_SESSION_ID, TEAM_SESSION_ID, FILE_ID
+)
+
+#! Scenarios ------------------------------------------------------------------
+# (name, router, method, path, request kwargs, streamed)
+SCENARIOS = [
+    ("status", "server", "GET", "/status", {}, False),
+    ("agents.get_public", "agents", "GET", "/agents/get_public", {}, False),
+    ("agents.get", "agents", "GET", f"/agents/get/{AGENT_ID}", {}, False),
+    ("agents.tools", "agents", "GET", "/agents/tools", {}, False),
+    ("agents.search", "agents", "GET", "/agents/search", {"params": {"query": "research"}}, False),
+    ("agents.update", "agents", "PUT", f"/agents/update/{AGENT_ID}", {"json": {"name": "Renamed"}}, False),
+    ("sessions.history", "sessions", "GET", f"/sessions/history/{STANDALONE_SESSION_ID}", {}, False),
+    ("sessions.get_all", "sessions", "GET", "/sessions/get_all", {}, False),
+    ("sessions.history_update", "sessions", "POST", f"/sessions/history/update/{STANDALONE_SESSION_ID}",
+        {"json": {"role": "user", "content": "hello"}}, False),
+    ("chat.agent", "chat", "POST", f"/chat/agent/{STANDALONE_SESSION_ID}",
+        {"params": {"agent_id": AGENT_ID}, "json": {"message": "hello"}}, False),
+    ("chat.agent_stream", "chat", "POST", f"/chat/agent/{STANDALONE_SESSION_ID}",
+        {"params": {"agent_id": AGENT_ID, "stream": True}, "json": {"message": "hello"}}, True),
+    ("chat.team_stream", "chat", "POST", f"/chat/team/{TEAM_SESSION_ID}",
+        {"params": {"stream": True}, "json": {"message": "hello"}}, True),
+    ("files.list", "files", "GET", f"/files/files/{AGENT_ID}", {}, False),
+    ("files.generate_url", "files", "POST", "/files/upload/generate_url",
+        {"params": {"file_name": "new.pdf", "file_type": "pdf", "file_size": 1, "agent_id": AGENT_ID}}, False),
+    ("files.download", "files", "GET", f"/files/download/{FILE_ID}", {}, False),
+    ("files.delete", "files", "DELETE", f"/files/delete/{FILE_ID}", {}, False),
+]
+
+#! Process management ---------------------------------------------------------
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise TimeoutError(f"Nothing listening on port {port} after {timeout}s")
+
+def process_rss(pid):
+    """Resident memory of a process and its children (uvicorn workers), in MB."""
+    process = psutil.Process(pid)
+    processes = [process] + process.children(recursive=True)
+    return sum(p.memory_info().rss for p in processes) / (1024 * 1024)
+
+#! Load generation ------------------------------------------------------------
+def percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def drive(client, scenario, duration, concurrency, headers):
+    name, router, method, path, kwargs, streamed = scenario
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                if streamed:
+                    async with client.stream(method, path, headers=headers, **kwargs) as response:
+                        async for _ in response.aiter_raw():
+                            pass
+                else:
+                    response = await client.request(method, path, headers=headers, **kwargs)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "scenario": name,
+        "router": router,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+async def run_scenarios(base_url, scenarios, args, token, api_pid):
+    headers = {"Authorization": f"Bearer {token}"}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        for scenario in scenarios:
+            await drive(client, scenario, args.warmup, args.concurrency, headers)
+            result = await drive(client, scenario, args.duration, args.concurrency, headers)
+            result["rss_mb"] = process_rss(api_pid)
+            results.append(result)
+            print_row(result)
+    return results
+
+#! Reporting ------------------------------------------------------------------
+HEADER = f"{'scenario':<26}{'requests':>9}{'errors':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'rss MB':>9}"
+
+def print_row(result):
+    print(f"{result['scenario']:<26}{result['requests']:>9}{result['errors']:>8}{result['rps']:>9.1f}"
+          f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['rss_mb']:>9.1f}", flush=True)
+
+def compare(results, baseline_file, tolerance):
+    """Return the scenarios that regressed against a previous --json run."""
+    with open(baseline_file) as file:
+        baseline = {row["scenario"]: row for row in json.load(file)["results"]}
+    regressions = []
+    for result in results:
+        previous = baseline.get(result["scenario"])
+        if not previous:
+            continue
+        if result["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{result['scenario']}: rps {previous['rps']:.1f} -> {result['rps']:.1f}")
+        if result["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{result['scenario']}: p95 {previous['p95_ms']:.1f}ms -> {result['p95_ms']:.1f}ms")
+    return regressions
+
+#! Entrypoint -----------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API against local stand-ins")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of load per scenario")
+    parser.add_argument("--warmup", type=float, default=1, help="Seconds of unmeasured load per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=1, help="API worker processes")
+    parser.add_argument("--loop", default="auto", choices=["auto", "asyncio", "uvloop"], help="API event loop")
+    parser.add_argument("--http", default="auto", choices=["auto", "h11", "httptools"], help="API HTTP parser")
+    parser.add_argument("--aiml-latency-ms", type=float, default=5)
+    parser.add_argument("--items", type=int, default=20, help="Items per upstream list page")
+    parser.add_argument("--tokens", type=int, default=50, help="Tokens per chat stream")
+    parser.add_argument("--token-delay-ms", type=float, default=0)
+    parser.add_argument("--scenario", action="append", help="Scenario or router name to run (repeatable)")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Fail when results regress against this --json file")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed regression ratio")
+    args = parser.parse_args()
+
+    scenarios = [s for s in SCENARIOS if not args.scenario or s[0] in args.scenario or s[1] in args.scenario]
+    ports = {name: free_port() for name in ("aiml", "jwks", "s3", "api")}
+    processes = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        key = jwk.JWK.generate(kty="RSA", size=2048, kid=KEY_ID)
+        key_file = os.path.join(tmp, "key.json")
+        with open(key_file, "w") as file:
+            file.write(key.export_private())
+
+        try:
+            processes.append(subprocess.Popen([
+                sys.executable, "-m", "benchmark.stubs",
+                "--aiml-port", str(ports["aiml"]), "--jwks-port", str(ports["jwks"]), "--s3-port", str(ports["s3"]),
+                "--key-file", key_file, "--latency-ms", str(args.aiml_latency_ms), "--items", str(args.items),
+                "--tokens", str(args.tokens), "--token-delay-ms", str(args.token_delay_ms)
+            ]))
+            for name in ("aiml", "jwks", "s3"):
+                wait_for_port(ports[name])
+
+            env = {
+                **os.environ,
+                "ENVIRONMENT": "benchmark",
+                "MONGO_URI": "mongodb://127.0.0.1:1",
+                "AIML_SERVICE_URL": f"http://127.0.0.1:{ports['aiml']}",
+                "JWKS_JSON": f"http://127.0.0.1:{ports['jwks']}/jwks.json",
+                "JWKS_ISSUER": ISSUER,
+                "AWS_ACCESS_KEY_ID": "benchmark",
+                "AWS_SECRET": "benchmark",
+                "AWS_ENDPOINT_URL_S3": f"http://127.0.0.1:{ports['s3']}",
+            }
+            api = subprocess.Popen([
+                sys.executable, "-m", "uvicorn", "benchmark.api:app", "--host", "127.0.0.1",
+                "--port", str(ports["api"]), "--workers", str(args.workers), "--loop", args.loop, "--http", args.http,
+                "--log-level", "warning", "--no-access-log"
+            ], env=env, stdout=subprocess.DEVNULL)
+            processes.append(api)
+            wait_for_port(ports["api"])
+
+            token = jwt.encode(
+                {"sub": USER_ID, "iss": ISSUER, "iat": int(time.time()), "exp": int(time.time()) + 3600},
+                key.export_to_pem(private_key=True, password=None), algorithm="RS256", headers={"kid": KEY_ID})
+
+            print(f"workers={args.workers} loop={args.loop} http={args.http} concurrency={args.concurrency} duration={args.duration}s "
+                  f"aiml_latency={args.aiml_latency_ms}ms items={args.items} tokens={args.tokens}")
+            print(HEADER)
+            results = asyncio.run(run_scenarios(f"http://127.0.0.1:{ports['api']}", scenarios, args, token, api.pid))
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                process.wait()
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=4)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""
+Local stand-ins for everything the API talks to, so it can be benchmarked in
+isolation: a fake AIML service, a JWKS server, an S3 stub and an in-memory
+Mongo substitute.
+
+Run the HTTP stand-ins with:
+    python -m benchmark.stubs --aiml-port 18000 --jwks-port 18001 --s3-port 18002 --key-file key.json
+"""
+import argparse
+import asyncio
+import json
+from datetime import datetime, timezone
+from bson import ObjectId
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+from jwcrypto import jwk
+import uvicorn
+
+#! Fixtures -------------------------------------------------------------------
+USER_ID = "user_benchmark"
+ISSUER = "benchmark"
+KEY_ID = "benchmark"
+AGENT_ID = "65f000000000000000000001"
+STANDALONE_SESSION_ID = "65f0000000000000000000a1"
+TEAM_SESSION_ID = "65f0000000000000000000b1"
+FILE_ID = "65f0000000000000000000c1"
+JOB_ID = "65f0000000000000000000d1"
+
+settings = {
+    "latency_ms": 5,    # Added to every AIML response
+    "items": 20,        # Items per list page
+    "tokens": 50,       # Tokens per SSE chat stream
+    "token_delay_ms": 0 # Delay between SSE tokens
+}
+
+def object_id(n):
+    return f"{n:024x}"
+
+def timestamp(n=0):
+    return datetime.fromtimestamp(1_700_000_000 + n, timezone.utc).isoformat()
+
+def make_agent(n):
+    return {
+        "_id": object_id(n + 1),
+        "name": f"Research Agent {n}",
+        "agent_type": ["public", "approved", "system", "private"][n % 4],
+        "user_id": USER_ID,
+        "capabilities": ["search the web", "summarize documents", "answer follow-up questions"],
+        "rules": ["cite sources", "be concise"],
+        "tools": ["web_search", "calculator"],
+        "created_at": timestamp(n),
+        "updated_at": timestamp(n)
+    }
+
+def make_message(n):
+    return {
+        "_id": object_id(1000 + n),
+        "role": "assistant" if n % 2 else "user",
+        "content": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 8,
+        "created_at": timestamp(n),
+        "rich_response": {
+            "tool_calls": [{"tool": "web_search", "query": f"query {n}", "results": [
+                {"title": f"Result {i}", "url": f"https://example.com/{n}/{i}", "snippet": "Snippet text " * 6}
+                for i in range(5)
+            ]}]
+        }
+    }
+
+def make_session(n, session_type="standalone"):
+    return {
+        "_id": object_id(2000 + n),
+        "name": f"Session {n}",
+        "agent_id": AGENT_ID,
+        "user_id": USER_ID,
+        "session_type": session_type,
+        "created_at": timestamp(n)
+    }
+
+def make_file(n):
+    return {
+        "_id": object_id(3000 + n),
+        "filename": f"document_{n}.pdf",
+        "file_type": "pdf",
+        "agent_id": AGENT_ID,
+        "s3_key": f"files/{USER_ID}/document_{n}.pdf",
+        "s3_bucket": "infinite-v2-data",
+        "collection_index": n % 3,
+        "created_at": timestamp(n)
+    }
+
+#! Fake AIML service ----------------------------------------------------------
+aiml_app = FastAPI()
+
+async def respond(payload):
+    await asyncio.sleep(settings["latency_ms"] / 1000)
+    return payload
+
+def page(factory, limit=None, skip=0, newest_first=False):
+    """A page of `settings["items"]` fixtures; like AIML it honours limit/skip but not keyset params."""
+    numbers = range(settings["items"] - 1, -1, -1) if newest_first else range(settings["items"])
+    return [factory(n) for n in list(numbers)[skip:skip + (limit or settings["items"])]]
+
+@aiml_app.get("/status")
+async def aiml_status():
+    return await respond({"server": "AIML", "status": "up"})
+
+@aiml_app.get("/agents/get/{agent_id}")
+async def aiml_get_agent(agent_id: str):
+    # Listed fixtures come back as listed, so search re-checks keep them
+    n = int(agent_id, 16) - 1 if agent_id != AGENT_ID and all(c in "0123456789abcdef" for c in agent_id) else 3
+    return await respond({"message": "Agent retrieved", "data": {**make_agent(n), "_id": agent_id}})
+
+@aiml_app.get("/agents/tools")
+async def aiml_tools():
+    return await respond({"message": "Tools retrieved", "data": [
+        {"name": f"tool_{n}", "description": "A tool " * 10} for n in range(12)
+    ]})
+
+@aiml_app.get("/agents/get_public")
+@aiml_app.get("/agents/get_approved")
+@aiml_app.get("/agents/get_system")
+@aiml_app.get("/agents/get_user/{user_id}")
+@aiml_app.get("/agents/get_user_nonprivate/{user_id}")
+@aiml_app.get("/agents/search")
+async def aiml_list_agents(limit: int = 20):
+    return await respond({"message": "Agents retrieved", "data": page(make_agent, limit)})
+
+@aiml_app.post("/agents/create")
+@aiml_app.put("/agents/update/{agent_id}")
+@aiml_app.delete("/agents/delete/{agent_id}")
+async def aiml_write_agent(request: Request):
+    return await respond({"message": "Agent saved", "agent_id": AGENT_ID})
+
+@aiml_app.get("/sessions/history/{session_id}")
+@aiml_app.get("/sessions/history/recent/{session_id}")
+@aiml_app.get("/sessions/team/history/{session_id}")
+async def aiml_history(session_id: str, limit: int = 20, skip: int = 0):
+    return await respond({"message": "History retrieved", "data": {
+        "history": page(make_message, limit, skip, newest_first=True), "total": settings["items"], "skip": skip, "limit": limit
+    }})
+
+@aiml_app.get("/sessions/get_all/{user_id}")
+@aiml_app.get("/sessions/get_all_team/{user_id}")
+@aiml_app.get("/sessions/get_all_standalone/{user_id}")
+@aiml_app.get("/sessions/get_by_agent/{agent_id}")
+async def aiml_list_sessions(limit: int = 20):
+    return await respond({"message": "Sessions retrieved", "data": page(make_session, limit)})
+
+@aiml_app.get("/sessions/get/{session_id}")
+async def aiml_get_session(session_id: str):
+    return await respond({"message": "Session retrieved", "data": {**make_session(0), "_id": session_id, "history": page(make_message)}})
+
+@aiml_app.post("/sessions/create")
+@aiml_app.post("/sessions/team/create")
+@aiml_app.delete("/sessions/delete/{session_id}")
+@aiml_app.post("/sessions/history/update/{session_id}")
+@aiml_app.post("/sessions/team/history/update/{session_id}")
+@aiml_app.put("/sessions/rename/{session_id}")
+async def aiml_write_session(request: Request):
+    return await respond({"message": "Session updated", "session_id": STANDALONE_SESSION_ID})
+
+async def token_stream():
+    for n in range(settings["tokens"]):
+        if settings["token_delay_ms"]:
+            await asyncio.sleep(settings["token_delay_ms"] / 1000)
+        yield f"data: {json.dumps({'token': f'token{n} '})}\n\n".encode()
+    yield b"data: [DONE]\n\n"
+
+@aiml_app.post("/chat/agent/{session_id}")
+@aiml_app.post("/chat/team/{session_id}")
+async def aiml_chat(session_id: str, stream: bool = False):
+    await asyncio.sleep(settings["latency_ms"] / 1000)
+    if stream:
+        return StreamingResponse(token_stream(), media_type="text/event-stream")
+    return {"message": "Chat response", "data": {"response": "token " * settings["tokens"], "rich_response": make_message(1)["rich_response"]}}
+
+@aiml_app.get("/files/files/all/{agent_id}")
+@aiml_app.get("/files/collections/files/{agent_id}/{collection_index}")
+async def aiml_list_files(limit: int = 20):
+    return await respond({"message": "Files retrieved", "data": page(make_file, limit)})
+
+@aiml_app.get("/files/files/get/{file_id}")
+async def aiml_get_file(file_id: str):
+    return await respond({**make_file(0), "_id": file_id})
+
+@aiml_app.get("/files/collections/all/{agent_id}")
+async def aiml_collections(agent_id: str):
+    return await respond({"message": "Collections retrieved", "data": [{"index": n, "name": f"Collection {n}"} for n in range(3)]})
+
+@aiml_app.delete("/files/{agent_id}/{file_id}")
+async def aiml_delete_file(agent_id: str, file_id: str):
+    return await respond({"message": "File deleted"})
+
+@aiml_app.post("/files/jobs/start")
+async def aiml_start_job():
+    return await respond({"message": "File processing started successfully", "job_id": JOB_ID})
+
+@aiml_app.get("/files/jobs/get/{job_id}")
+async def aiml_get_job(job_id: str):
+    return await respond({"message": "Job details retrieved successfully", "data": {"_id": job_id, "status": "completed", "progress": 100}})
+
+#! JWKS server ----------------------------------------------------------------
+def load_key(key_file):
+    with open(key_file) as file:
+        return jwk.JWK(**json.load(file))
+
+def jwks_app_for(key):
+    app = FastAPI()
+    public = json.loads(key.export_public())
+
+    @app.get("/jwks.json")
+    async def jwks():
+        return {"keys": [public]}
+
+    return app
+
+#! S3 stub --------------------------------------------------------------------
+s3_app = FastAPI()
+s3_objects = {}
+
+@s3_app.api_route("/{bucket}/{key:path}", methods=["GET", "PUT", "HEAD", "DELETE"])
+async def s3_object(bucket: str, key: str, request: Request):
+    if request.method == "PUT":
+        s3_objects[(bucket, key)] = await request.body()
+        return Response(status_code=200, headers={"ETag": '"stub"'})
+    if request.method == "DELETE":
+        s3_objects.pop((bucket, key), None)
+        return Response(status_code=204)
+    if (bucket, key) not in s3_objects:
+        return Response(status_code=404)
+    body = s3_objects[(bucket, key)]
+    if request.method == "HEAD":
+        return Response(status_code=200, headers={"Content-Length": str(len(body)), "ETag": '"stub"'})
+    return Response(content=body, media_type="application/octet-stream")
+
+@s3_app.head("/{bucket}")
+async def s3_head_bucket(bucket: str):
+    return Response(status_code=200)
+
+@s3_app.post("/{bucket}")
+async def s3_delete_objects(bucket: str, request: Request):
+    # DeleteObjects: acknowledge every key in the request
+    body = (await request.body()).decode()
+    keys = [part.split("</Key>")[0] for part in body.split("<Key>")[1:]]
+    for key in keys:
+        s3_objects.pop((bucket, key), None)
+    deleted = "".join(f"<Deleted><Key>{key}</Key></Deleted>" for key in keys)
+    return Response(
+        content=f'<?xml version="1.0" encoding="UTF-8"?><DeleteResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">{deleted}</DeleteResult>',
+        media_type="application/xml")
+
+#! In-memory Mongo substitute -------------------------------------------------
+class FakeInsertResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+class FakeUpdateResult:
+    def __init__(self, matched_count):
+        self.matched_count = matched_count
+        self.modified_count = matched_count
+
+class FakeCollection:
+    """The subset of a pymongo collection the API touches, backed by a dict."""
+
+    def __init__(self):
+        self.documents = {}
+
+    def _matches(self, document, query):
+        return all(self._match_value(document.get(key), value) for key, value in (query or {}).items())
+
+    def _match_value(self, actual, expected):
+        if isinstance(expected, dict) and expected and all(op.startswith("$") for op in expected):
+            checks = {
+                "$in": lambda v: actual in v,
+                "$lte": lambda v: actual is not None and actual <= v,
+                "$lt": lambda v: actual is not None and actual < v,
+                "$gte": lambda v: actual is not None and actual >= v,
+                "$gt": lambda v: actual is not None and actual > v,
+            }
+            return all(checks[op](value) for op, value in expected.items())
+        return actual == expected
+
+    def _apply(self, document, update):
+        for key, value in update.get("$set", {}).items():
+            document[key] = value
+        for key, value in update.get("$inc", {}).items():
+            document[key] = document.get(key, 0) + value
+
+    def update_one(self, query, update, *args, **kwargs):
+        document = self.find_one(query)
+        if document is not None:
+            self._apply(document, update)
+        return FakeUpdateResult(0 if document is None else 1)
+
+    def find_one_and_update(self, query, update, sort=None, return_document=False, **kwargs):
+        matches = self.find(query)
+        for key, direction in reversed(sort or []):
+            matches.sort(key=lambda doc: doc.get(key), reverse=direction == -1)
+        if not matches:
+            return None
+        self._apply(matches[0], update)
+        return dict(matches[0])
+
+    def find_one(self, query=None, *args, **kwargs):
+        if query and set(query) == {"_id"}:
+            return self.documents.get(query["_id"])
+        return next((doc for doc in self.documents.values() if self._matches(doc, query)), None)
+
+    def find(self, query=None, *args, **kwargs):
+        return [doc for doc in self.documents.values() if self._matches(doc, query)]
+
+    def insert_one(self, document):
+        document.setdefault("_id", ObjectId())
+        self.documents[document["_id"]] = document
+        return FakeInsertResult(document["_id"])
+
+class FakeDatabase:
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeCollection())
+
+    __getattr__ = __getitem__
+
+    def list_collection_names(self):
+        return list(self.collections)
+
+    def create_collection(self, name):
+        return self[name]
+
+    def command(self, name, *args, **kwargs):
+        return {"ok": 1.0}
+
+class FakeMongoClient:
+    def __init__(self):
+        self.databases = {}
+        sessions = self["ai"]["sessions"]
+        sessions.insert_one({"_id": ObjectId(STANDALONE_SESSION_ID), "session_type": "standalone", "user_id": USER_ID})
+        sessions.insert_one({"_id": ObjectId(TEAM_SESSION_ID), "session_type": "team", "user_id": USER_ID})
+
+    def __getitem__(self, name):
+        return self.databases.setdefault(name, FakeDatabase())
+
+    __getattr__ = __getitem__
+
+    def close(self):
+        pass
+
+    def list_database_names(self):
+        return list(self.databases)
+
+#! Entrypoint -----------------------------------------------------------------
+async def serve(apps):
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+        for app, port in apps
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the AIML, JWKS and S3 stand-ins")
+    parser.add_argument("--aiml-port", type=int, required=True)
+    parser.add_argument("--jwks-port", type=int, required=True)
+    parser.add_argument("--s3-port", type=int, required=True)
+    parser.add_argument("--key-file", required=True)
+    parser.add_argument("--latency-ms", type=float, default=settings["latency_ms"])
+    parser.add_argument("--items", type=int, default=settings["items"])
+    parser.add_argument("--tokens", type=int, default=settings["tokens"])
+    parser.add_argument("--token-delay-ms", type=float, default=settings["token_delay_ms"])
+    args = parser.parse_args()
+
+    settings.update(latency_ms=args.latency_ms, items=args.items, tokens=args.tokens, token_delay_ms=args.token_delay_ms)
+    asyncio.run(serve([
+        (aiml_app, args.aiml_port),
+        (jwks_app_for(load_key(args.key_file)), args.jwks_port),
+        (s3_app, args.s3_port),
+    ]))
@@ -1,24 +1,39 @@
+import threading
 from pymongo import MongoClient
-from keys.keys import mongo_uri, environment
-from ultraprint.logging import logger
-from ultraconfiguration import UltraConfig
+from keys.keys import mongo_uri
+from utilities.settings import config, get_logger
+from utilities.metrics import MongoMetricsListener
 
 #! Initialize ---------------------------------------------------------------
-config = UltraConfig('config.json')
-log = logger('mongo_log', 
-            filename='debug/mongo.log', 
-            include_extra_info=config.get("logging.include_extra_info", False), 
-            write_to_file=config.get("logging.write_to_file", False), 
-            log_level=config.get("logging.development_level", "DEBUG") if environment == 'development' else config.get("logging.production_level", "INFO"))
+log = get_logger('mongo_log', 'debug/mongo.log')
 
-client = MongoClient(mongo_uri)
+# Created on first use so importing the app does not resolve or connect to Mongo
+client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Return the process-wide MongoClient, creating it on first use."""
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                client = MongoClient(mongo_uri, event_listeners=[MongoMetricsListener()])
+    return client
+
+def close_client():
+    """Close the MongoClient if one was created."""
+    global client
+    with _client_lock:
+        if client is not None:
+            client.close()
+            client = None
 
 #! MongoDB functions ---------------------------------------------------------
 #* Check if MongoDB connection is successful ---------------------------------
 def pingtest():
     # Send a ping to confirm a successful connection
     try:
-        client.admin.command('ping')
+        get_client().admin.command('ping')
         return True
     except Exception as e:
         log.error(e)
@@ -27,31 +42,91 @@ def pingtest():
 #* Ensure required databases and collections exist ---------------------------
 def database_exists(db_name):
     """Check if a database exists."""
-    return db_name in client.list_database_names()
+    return db_name in get_client().list_database_names()
 
 def collection_exists(db_name, collection_name):
     """Check if a collection exists in a database."""
     if not database_exists(db_name):
         return False
-    return collection_name in client[db_name].list_collection_names()
+    return collection_name in get_client()[db_name].list_collection_names()
 
 def get_required_structure():
     """Get the required MongoDB structure."""
     return config.get("mongo.structure", {})
 
-def init_db_structure():
-    """Initialize all required databases and collections."""
+def init_db_structure(drop_extra_indexes=False):
+    """Initialize all required databases, collections and indexes."""
     required_structure = get_required_structure()
 
     for db_name, collections in required_structure.items():
         # Create database by accessing it
-        db = client[db_name]
+        db = get_client()[db_name]
         for collection_name in collections:
             if not collection_exists(db_name, collection_name):
                 # Create collection by accessing it
                 db.create_collection(collection_name)
                 log.success(f"Created collection '{collection_name}' in database '{db_name}'")
 
+    ensure_indexes(drop_extra=drop_extra_indexes)
+
+#* Declarative index management ----------------------------------------------
+# Indexes are declared in config.json under mongo.indexes as
+#   {db: {collection: [{"keys": [[field, direction], ...], "name": ..., "options": {...}}]}}
+# where options are passed to create_index (unique, sparse, expireAfterSeconds,
+# partialFilterExpression, ...). The _id index is implicit and never touched.
+COMPARED_INDEX_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+def get_required_indexes():
+    """Get the required MongoDB indexes."""
+    return config.get("mongo.indexes", {})
+
+def index_name(keys):
+    """MongoDB's default name for an index key pattern."""
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+def normalize_index_spec(spec):
+    """Return (name, keys, options) for an index spec from config."""
+    keys = [(field, direction) for field, direction in spec["keys"]]
+    return spec.get("name") or index_name(keys), keys, dict(spec.get("options", {}))
+
+def index_differs(existing, keys, options):
+    """Whether an existing index (from index_information) differs from the declared spec."""
+    if [(field, direction) for field, direction in existing["key"]] != keys:
+        return True
+    return any(existing.get(option) != options.get(option) for option in COMPARED_INDEX_OPTIONS)
+
+def diff_indexes(db_name, collection_name, specs):
+    """Compare declared and existing indexes: (missing, mismatched, extra) index names."""
+    existing = get_client()[db_name][collection_name].index_information()
+    declared = [normalize_index_spec(spec) for spec in specs]
+    missing = [name for name, _, _ in declared if name not in existing]
+    mismatched = [name for name, keys, options in declared
+                  if name in existing and index_differs(existing[name], keys, options)]
+    declared_names = {name for name, _, _ in declared}
+    extra = [name for name in existing if name != "_id_" and name not in declared_names]
+    return missing, mismatched, extra
+
+def ensure_indexes(drop_extra=False):
+    """Create missing indexes and rebuild changed ones, idempotently."""
+    for db_name, collections in get_required_indexes().items():
+        for collection_name, specs in collections.items():
+            collection = get_client()[db_name][collection_name]
+            missing, mismatched, extra = diff_indexes(db_name, collection_name, specs)
+            for spec in specs:
+                name, keys, options = normalize_index_spec(spec)
+                if name in mismatched:
+                    collection.drop_index(name)
+                    log.warning(f"Dropped outdated index '{name}' on '{db_name}.{collection_name}'")
+                if name in missing or name in mismatched:
+                    collection.create_index(keys, name=name, **options)
+                    log.success(f"Created index '{name}' on '{db_name}.{collection_name}'")
+            for name in extra:
+                if drop_extra:
+                    collection.drop_index(name)
+                    log.warning(f"Dropped undeclared index '{name}' on '{db_name}.{collection_name}'")
+                else:
+                    log.info(f"Keeping undeclared index '{name}' on '{db_name}.{collection_name}'")
+
 def check_mongo_structure(verbose=True):
     """Comprehensive check of the MongoDB structure with verbose output."""
     if verbose:
@@ -92,5 +167,26 @@ def check_mongo_structure(verbose=True):
             
             if verbose:                
                 log.success(f"Collection '{collection_name}' exists")
+
+    for db_name, collections in get_required_indexes().items():
+        for collection_name, specs in collections.items():
+            if not collection_exists(db_name, collection_name):
+                continue
+            if verbose:
+                log.info(f"Checking indexes on '{db_name}.{collection_name}'...")
+            missing, mismatched, extra = diff_indexes(db_name, collection_name, specs)
+            for name in missing:
+                if verbose:
+                    log.error(f"Index '{name}' is missing!")
+                all_ok = False
+            for name in mismatched:
+                if verbose:
+                    log.error(f"Index '{name}' does not match its declaration!")
+                all_ok = False
+            for name in extra:
+                if verbose:
+                    log.warning(f"Index '{name}' is not declared in config")
+            if verbose and not missing and not mismatched:
+                log.success(f"Indexes on '{db_name}.{collection_name}' are up to date")
     return all_ok
 
@@ -1,21 +1,48 @@
+import asyncio
+import time
 from fastapi import Depends, HTTPException, Request
 import jwt
-import requests
-from jwcrypto import jwk
+from jwt.algorithms import RSAAlgorithm
 from keys.keys import jwks_json, jwks_issuer
+from utilities.forward import get_http_client
+from utilities.timing import span
 
-# Fetch JWKS keys
-jwks_data = requests.get(jwks_json).json()
-jwks_keys = {key["kid"]: key for key in jwks_data["keys"]}
+# Signing keys by kid, parsed once into key objects. The JWKS is fetched on the
+# first request rather than at import, and refetched when a token names a kid
+# we have not seen (the issuer rotated its keys), at most once per interval
+# after a successful fetch. Failed fetches do not count, so they are retried
+# by the next request (one at a time, under the lock).
+JWKS_REFRESH_INTERVAL = 60
+jwks_keys = {}
+_last_refresh = None
+_refresh_lock = asyncio.Lock()
 
-def decode_jwt(token: str):
-    headers = jwt.get_unverified_header(token)
-    key = jwks_keys.get(headers["kid"])
-    if not key:
+async def refresh_jwks():
+    global jwks_keys, _last_refresh
+    try:
+        response = await get_http_client().get(jwks_json, timeout=10)
+        response.raise_for_status()
+        jwks_data = response.json()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Unable to fetch signing keys: {e}")
+    jwks_keys = {key["kid"]: RSAAlgorithm.from_jwk(key) for key in jwks_data["keys"]}
+    _last_refresh = time.monotonic()
+
+async def get_signing_key(kid: str):
+    key = jwks_keys.get(kid)
+    if key is None:
+        async with _refresh_lock:
+            key = jwks_keys.get(kid)
+            if key is None and (_last_refresh is None or time.monotonic() - _last_refresh >= JWKS_REFRESH_INTERVAL):
+                with span("auth", "jwks fetch"):
+                    await refresh_jwks()
+                key = jwks_keys.get(kid)
+    if key is None:
         raise HTTPException(status_code=401, detail="Invalid token")
+    return key
 
-    key = jwk.JWK(**key)
-    return jwt.decode(token, key.export_to_pem(), algorithms=["RS256"], issuer=jwks_issuer)
+def decode_jwt(token: str, key):
+    return jwt.decode(token, key, algorithms=["RS256"], issuer=jwks_issuer)
 
 async def get_current_user(request: Request):
     authorization = request.headers.get("Authorization")
@@ -23,6 +50,11 @@ async def get_current_user(request: Request):
         raise HTTPException(status_code=401, detail="Unauthorized")
     token = authorization.split("Bearer ")[1]
     try:
-        return decode_jwt(token)
+        headers = jwt.get_unverified_header(token)
+        key = await get_signing_key(headers["kid"])
+        with span("auth", "jwt verify"):
+            return decode_jwt(token, key)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=401, detail=str(e))
@@ -1,22 +1,106 @@
-from database.mongo import client as db
+from database.mongo import get_client
 import csv
+import gzip
 import os
-from datetime import datetime, timezone
+import shutil
+import threading
+from datetime import datetime, timezone, timedelta
 import traceback
-from keys.keys import environment
-from ultraprint.logging import logger
-from ultraconfiguration import UltraConfig
+from utilities.settings import config, get_logger
+from utilities.task_queue import task_queue
 
 #! Initialize ---------------------------------------------------------------
-config = UltraConfig('config.json')
-log = logger('error_log', 
-            filename='debug/error.log', 
-            include_extra_info=config.get("logging.include_extra_info", False), 
-            write_to_file=config.get("logging.write_to_file", False), 
-            log_level=config.get("logging.development_level", "DEBUG") if environment == 'development' else config.get("logging.production_level", "INFO"))
+log = get_logger('error_log', 'debug/error.log')
 
-# Collection for error logs
-collection = db.logs.error
+def error_collection():
+    """Collection for error logs (expired by the TTL index declared in config.json)"""
+    return get_client().logs.error
+
+#! CSV log ---------------------------------------------------------------------
+CSV_FILE_PATH = "debug/error_log.csv"
+CSV_HEADER = ["timestamp", "function", "exception", "traceback", "url", "method", "headers"]
+_csv_started = {}
+_csv_lock = threading.Lock()
+
+def csv_started_at(path=CSV_FILE_PATH):
+    """Timestamp of the first row in the CSV log, or None if it has no rows."""
+    try:
+        with open(path, newline='') as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            row = next(reader, None)
+        return datetime.fromisoformat(row[0]) if row else None
+    except (OSError, ValueError, csv.Error):
+        return None
+
+def csv_needs_rotation(path=CSV_FILE_PATH):
+    """Whether the CSV log is over its size or age limit."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if stat.st_size >= config.get("retention.error_csv_max_bytes", 10 * 1024 * 1024):
+        return True
+    # The first row never changes for a given file, so read it once per inode
+    started_at = _csv_started.get(stat.st_ino)
+    if started_at is None:
+        started_at = csv_started_at(path)
+        if started_at is not None:
+            _csv_started.clear()
+            _csv_started[stat.st_ino] = started_at
+    max_age = timedelta(days=config.get("retention.error_csv_max_age_days", 7))
+    return started_at is not None and datetime.now(timezone.utc) - started_at >= max_age
+
+def rotate_csv(path=CSV_FILE_PATH):
+    """
+    Move the CSV log to <path>.1.gz, shifting older backups up and dropping
+    the ones past retention.error_csv_backups.
+    """
+    backups = config.get("retention.error_csv_backups", 5)
+    # Claim the live file with an atomic rename so concurrent workers rotate it once
+    claimed = f"{path}.{os.getpid()}.rotating"
+    try:
+        os.replace(path, claimed)
+    except FileNotFoundError:
+        return False
+    for index in range(backups, 0, -1):
+        backup = f"{path}.{index}.gz"
+        if not os.path.exists(backup):
+            continue
+        if index == backups:
+            os.remove(backup)
+        else:
+            os.replace(backup, f"{path}.{index + 1}.gz")
+    if backups > 0:
+        with open(claimed, 'rb') as source, gzip.open(f"{path}.1.gz", 'wb') as target:
+            shutil.copyfileobj(source, target)
+    os.remove(claimed)
+    log.info(f"Rotated {path}")
+    return True
+
+def append_csv_row(row):
+    """Append one error row to the CSV log, rotating it first if it is due."""
+    if csv_needs_rotation():
+        rotate_csv()
+    file_exists = os.path.isfile(CSV_FILE_PATH)
+    with open(CSV_FILE_PATH, mode='a', newline='') as file:
+        writer = csv.writer(file)
+        if not file_exists:
+            writer.writerow(CSV_HEADER)
+        writer.writerow(row + [""] * (len(CSV_HEADER) - len(row)))
+
+def write_error(error_entry, csv_row):
+    """Persist one error to MongoDB and the CSV log. Runs in a worker thread."""
+    try:
+        error_collection().insert_one(error_entry)
+    except Exception as e:
+        log.error(e)
+    try:
+        # Rows are written from several threads; keep each one whole
+        with _csv_lock:
+            append_csv_row(csv_row)
+    except Exception as e:
+        log.error(e)
 
 def log_exception(exception, function):
 
@@ -34,15 +118,8 @@ def log_exception(exception, function):
             "traceback": tb,
             "timestamp": datetime.now(timezone.utc)
         }
-        collection.insert_one(error_entry)
-        # Log to CSV
-        csv_file_path = "debug/error_log.csv"
-        file_exists = os.path.isfile(csv_file_path)
-        with open(csv_file_path, mode='a', newline='') as file:
-            writer = csv.writer(file)
-            if not file_exists:
-                writer.writerow(["timestamp", "function", "exception", "traceback"])
-            writer.writerow([datetime.now(timezone.utc), function_name, str(exception), tb])
+        # Write to MongoDB and CSV off the request path
+        task_queue.defer(write_error, error_entry, [datetime.now(timezone.utc), function_name, str(exception), tb])
     except Exception as e:
         log.error(e)
 
@@ -68,23 +145,16 @@ def log_exception_with_request(exception, function, request):
             "timestamp": datetime.now(timezone.utc),
             "request": request_info
         }
-        collection.insert_one(error_entry)
         
-        # Log to CSV
-        csv_file_path = "debug/error_log.csv"
-        file_exists = os.path.isfile(csv_file_path)
-        with open(csv_file_path, mode='a', newline='') as file:
-            writer = csv.writer(file)
-            if not file_exists:
-                writer.writerow(["timestamp", "function", "exception", "traceback", "url", "method", "headers"])
-            writer.writerow([
-                datetime.now(timezone.utc), 
-                function_name, 
-                str(exception), 
-                tb, 
-                str(request.url), 
-                request.method, 
-                str(dict(request.headers))
-            ])
+        # Write to MongoDB and CSV off the request path
+        task_queue.defer(write_error, error_entry, [
+            datetime.now(timezone.utc), 
+            function_name, 
+            str(exception), 
+            tb, 
+            request_info["url"], 
+            request_info["method"], 
+            str(request_info["headers"])
+        ])
     except Exception as e:
         log.error(e)
\ No newline at end of file
@@ -25,3 +25,6 @@ aws_secret = os.getenv("AWS_SECRET")
 clerk_secret_key = os.getenv("CLERK_SECRET_KEY")
 jwks_json = os.getenv("JWKS_JSON")
 jwks_issuer = os.getenv("JWKS_ISSUER")
+
+#* Profiling ------------------------------------------------
+profiling_token = os.getenv("PROFILING_TOKEN")
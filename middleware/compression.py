@@ -0,0 +1,171 @@
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # Optional: brotli is offered only when installed
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: zstd is offered only when installed
+    zstandard = None
+
+DEFAULT_CONTENT_TYPES = ("application/json", "text/plain", "text/html", "text/csv", "application/xml")
+
+#! Encoders -------------------------------------------------------------------
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data, flush=False):
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data, flush=False):
+        out = self._compressor.process(data)
+        return out + self._compressor.flush() if flush else out
+
+    def finish(self):
+        return self._compressor.finish()
+
+class ZstdEncoder:
+    name = "zstd"
+
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data, flush=False):
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else out
+
+    def finish(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+def q_value(text):
+    """A q-value as a float; anything malformed counts as 0 (not accepted)."""
+    try:
+        q = float(text)
+    except ValueError:
+        return 0.0
+    return q if 0 <= q <= 1 else 0.0
+
+def accepted_encodings(accept_encoding):
+    """Encodings the client accepts (q > 0), lowercased."""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q=") and q_value(params[2:]) == 0:
+            continue
+        accepted.add(name.strip())
+    return accepted
+
+#! Middleware -----------------------------------------------------------------
+class CompressionMiddleware:
+    """
+    Compresses eligible responses with brotli, zstd or gzip. Small bodies,
+    content types outside the allowlist, already-encoded bodies and event
+    streams pass through untouched; streamed bodies are flushed per chunk so
+    nothing is held back.
+    """
+
+    def __init__(self, app, minimum_size=1024, content_types=DEFAULT_CONTENT_TYPES,
+                 gzip_level=6, brotli_quality=4, zstd_level=3):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.content_types = tuple(content_types)
+        self.factories = []
+        if brotli is not None:
+            self.factories.append(("br", lambda: BrotliEncoder(brotli_quality)))
+        if zstandard is not None:
+            self.factories.append(("zstd", lambda: ZstdEncoder(zstd_level)))
+        self.factories.append(("gzip", lambda: GzipEncoder(gzip_level)))
+
+    def _select(self, scope):
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        for name, factory in self.factories:
+            if name in accepted:
+                return factory
+        return None
+
+    def _eligible(self, headers):
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type == "text/event-stream" or not content_type.startswith(self.content_types):
+            return False
+        content_length = headers.get("content-length")
+        return content_length is None or int(content_length) >= self.minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        factory = self._select(scope)
+        if factory is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        encoder = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, encoder, passthrough
+            if message["type"] == "http.response.start":
+                if not self._eligible(Headers(raw=message["headers"])):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message  # Held until the first body chunk shows the size
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                encoder = factory()
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers["content-encoding"] = encoder.name
+                headers.add_vary_header("accept-encoding")
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # The encoded bytes differ from the identity representation
+                    headers["etag"] = f"W/{etag}"
+                if more_body:
+                    del headers["content-length"]
+                    await send(start_message)
+                else:
+                    body = encoder.compress(body) + encoder.finish()
+                    headers["content-length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send({"type": "http.response.body", "body": encoder.compress(body, flush=True), "more_body": True})
+                return
+
+            if more_body:
+                await send({"type": "http.response.body", "body": encoder.compress(body, flush=True), "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": encoder.compress(body) + encoder.finish()})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,76 @@
+from hashlib import blake2b
+from starlette.datastructures import Headers, MutableHeaders
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against an ETag (RFC 9110 13.1.2)."""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+class ETagMiddleware:
+    """
+    Adds strong ETags to successful GET responses of the configured routes and
+    answers a matching If-None-Match with 304 and an empty body. Upstream
+    ETags are reused; otherwise the body bytes are hashed.
+    """
+
+    def __init__(self, app, routes=(), max_age=0, max_body_size=1024 * 1024):
+        self.app = app
+        self.routes = set(routes)
+        self.cache_control = f"private, max-age={max_age}" if max_age else "private, no-cache"
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start_message = None
+        chunks = []
+        size = 0
+        passthrough = False
+
+        async def send_with_etag(message):
+            nonlocal start_message, size, passthrough
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                if message["status"] != 200 or route is None or route.path not in self.routes:
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            if size > self.max_body_size:
+                # Too large to hold: send what we have without an ETag
+                passthrough = True
+                await send(start_message)
+                await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": message.get("more_body", False)})
+                return
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start_message["headers"])
+            etag = headers.get("etag") or f'"{blake2b(body, digest_size=16).hexdigest()}"'
+            headers["etag"] = etag
+            headers["cache-control"] = self.cache_control
+            if if_none_match and etag_matches(if_none_match, etag):
+                not_modified = MutableHeaders()
+                for name in ("etag", "cache-control", "vary", "server-timing", "timing-allow-origin"):
+                    if name in headers:
+                        not_modified[name] = headers[name]
+                await send({"type": "http.response.start", "status": 304, "headers": not_modified.raw})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_with_etag)
@@ -0,0 +1,11 @@
+class LoopMonitorMiddleware:
+    """ASGI middleware tagging request tasks so the loop watchdog can name the blocking route."""
+
+    def __init__(self, app, monitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            self.monitor.track_request(scope)
+        await self.app(scope, receive, send)
@@ -0,0 +1,54 @@
+import asyncio
+import hmac
+import random
+from utilities.settings import config, get_logger
+from utilities.profiler import RequestProfiler, write_profile
+
+#! Initialize ---------------------------------------------------------------
+log = get_logger('profiling_log', 'debug/profiling.log')
+
+class ProfilingMiddleware:
+    """
+    Runs selected requests under the sampling profiler. A request is profiled
+    when it carries a matching X-Profile header or is picked by the sampling rate.
+    Only installed when profiling is enabled in config.
+    """
+
+    def __init__(self, app, token=None, sample_rate=0.0, interval_ms=5, max_concurrent=2):
+        self.app = app
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+        self.interval_ms = interval_ms
+        self.max_concurrent = max_concurrent
+        self.active = 0
+
+    def _should_profile(self, scope):
+        if self.active >= self.max_concurrent:
+            return False
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == b"x-profile":
+                    return hmac.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self.active += 1
+        profiler = RequestProfiler(interval_ms=self.interval_ms)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.active -= 1
+            profiler.stop()
+            await asyncio.to_thread(profiler.join)
+            route = scope.get("route")
+            route_path = route.path if route is not None else scope["path"]
+            try:
+                path = await asyncio.to_thread(write_profile, f"{scope['method']}_{route_path}", profiler)
+                log.info(f"Profiled {scope['method']} {route_path}: {profiler.samples} samples written to {path}")
+            except Exception as e:
+                log.error(f"Failed to write profile for {route_path}: {e}")
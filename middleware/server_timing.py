@@ -0,0 +1,58 @@
+import json
+from time import perf_counter
+from utilities.settings import config, get_logger
+from utilities.timing import begin_request, end_request, format_server_timing
+
+#! Initialize ---------------------------------------------------------------
+log = get_logger('timing_log', 'debug/timing.log')
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware that collects per-request spans, returns them in a
+    Server-Timing header and logs a structured line for slow requests.
+    """
+
+    def __init__(self, app, slow_request_ms=1000):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = perf_counter()
+        token, spans = begin_request()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Only spans finished before the response starts can be reported in the header
+                header = format_server_timing(spans, (perf_counter() - start) * 1000)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", header.encode("latin-1")),
+                    (b"timing-allow-origin", b"*"),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            end_request(token)
+            total_ms = (perf_counter() - start) * 1000
+            if total_ms >= self.slow_request_ms:
+                route = scope.get("route")
+                log.warning(json.dumps({
+                    "event": "slow_request",
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": route.path if route is not None else None,
+                    "status": status_code,
+                    "duration_ms": round(total_ms, 1),
+                    "spans": [
+                        {"name": name, "desc": description, "duration_ms": round(duration_ms, 1)}
+                        for name, description, duration_ms in spans
+                    ],
+                }))
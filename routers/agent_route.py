@@ -1,12 +1,88 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Request, Body, Query, Depends
 from keys.keys import aiml_service_url
 from dependencies.auth import get_current_user
 from utilities.forward import forward_request
+from utilities.pagination import cursor_query, forward_cursor_page, page_items
 from errors.error_logger import log_exception_with_request
 from utilities.error_handler import handle_request_error
+from utilities.agent_index import agent_index, agent_index_refresher, LISTED_TYPES, score_agent, rank
+from utilities.json_encoder import MongoJSONResponse
+from utilities.timing import span
+from utilities.cache import TTLCache
+from utilities.settings import config
 
 router = APIRouter()
 
+# Agent details by ID, shared by the batch endpoint and dropped on update/delete
+agent_cache = TTLCache("agents", max_size=config.get("agents.cache_max_size", 2048), ttl=config.get("agents.cache_ttl_s", 30))
+
+# Type, owner and version by agent ID, enough for update_agent's checks without a pre-read
+agent_meta_cache = TTLCache("agent_meta", max_size=config.get("agents.cache_max_size", 2048), ttl=config.get("agents.cache_ttl_s", 30))
+
+def remember_agent(agent):
+    """Cache an agent's metadata and return it."""
+    meta = {
+        "agent_type": agent.get('agent_type'),
+        "user_id": agent.get('user_id'),
+        "version": str(agent.get('version') or agent.get('updated_at') or "")
+    }
+    if agent.get('_id'):
+        agent_meta_cache.set(str(agent['_id']), meta)
+    return meta
+
+async def agent_metadata(agent_id, user_id, refresh=False):
+    """Metadata from the cache, or from AIML when missing or `refresh` is set. Returns (meta, cached)."""
+    meta = None if refresh else agent_meta_cache.get(agent_id)
+    if meta is not None:
+        return meta, True
+    current_agent = await forward_request('get', f"{aiml_service_url}/agents/get/{agent_id}", user_id=user_id)
+    current_agent = current_agent.get('data', {})
+    return remember_agent({'_id': agent_id, **current_agent}), False
+
+def invalidate_agent(agent_id):
+    agent_index.remove(agent_id)
+    agent_cache.pop(agent_id)
+    agent_meta_cache.pop(agent_id)
+
+async def still_listed(ranked, count, user_id):
+    """
+    The first `count` agents of `ranked` that are still listed. Index hits are
+    checked against the metadata cache, or AIML on a miss, so an agent deleted
+    or made private through another worker is not served until the next full
+    refresh; such agents are dropped from this worker's index as well.
+    """
+    semaphore = asyncio.Semaphore(config.get("agents.get_many_concurrency", 8))
+
+    async def check(agent):
+        if agent.get('agent_type') not in LISTED_TYPES:
+            return True  # The user's own private agents, from a live search
+        agent_id = str(agent.get('_id'))
+        async with semaphore:
+            try:
+                meta, _ = await agent_metadata(agent_id, user_id)
+            except HTTPException as e:
+                if e.status_code not in (403, 404):
+                    raise
+                meta = None
+        if meta is None or meta.get('agent_type') not in LISTED_TYPES:
+            agent_index.remove(agent_id)
+            return False
+        return True
+
+    kept = []
+    position = 0
+    while len(kept) < count and position < len(ranked):
+        batch = ranked[position:position + count - len(kept)]
+        position += len(batch)
+        listed = await asyncio.gather(*(check(agent) for agent in batch))
+        kept += [agent for agent, ok in zip(batch, listed) if ok]
+    return kept
+
+def visible_to(agent, user_id):
+    """Whether a cached agent may be served to this user without asking AIML."""
+    return agent.get('agent_type') != 'private' or agent.get('user_id') == user_id
+
 @router.post("/create")
 async def create_agent(
     request: Request,
@@ -31,7 +107,9 @@ async def create_agent(
             "name": name
         }
         # Change from '/agents/create' to '/agent/create' to match the other server's API
-        return await forward_request('post', f"{aiml_service_url}/agents/create", params=url_params, json=body)
+        response = await forward_request('post', f"{aiml_service_url}/agents/create", params=url_params, json=body, passthrough=True)
+        agent_index_refresher.request_refresh()
+        return response
     except Exception as e:
         await handle_request_error(e, create_agent, request)
 
@@ -42,9 +120,24 @@ async def get_public_agents(
     skip: int = 0,
     sort_by: str = Query("created_at"),
     sort_order: int = Query(-1),
+    cursor: dict = Depends(cursor_query),
     user: dict = Depends(get_current_user)
 ):
     try:
+        if cursor is not None:
+            return await forward_cursor_page(
+                'get', 
+                f"{aiml_service_url}/agents/get_public",
+                cursor,
+                params={
+                    'limit': limit, 
+                    'skip': skip, 
+                    'sort_by': sort_by, 
+                    'sort_order': sort_order,
+                    'user_id': user.get('sub')  # Add user_id to params
+                },
+                sort_order=sort_order
+            )
         return await forward_request(
             'get', 
             f"{aiml_service_url}/agents/get_public",
@@ -54,7 +147,8 @@ async def get_public_agents(
                 'sort_by': sort_by, 
                 'sort_order': sort_order,
                 'user_id': user.get('sub')  # Add user_id to params
-            }
+            },
+            passthrough=True
         )
     except Exception as e:
         await handle_request_error(e, get_public_agents, request)
@@ -67,9 +161,12 @@ async def delete_agent(
 ):
     try:
         user_id = user.get("sub")
-        return await forward_request('delete', f"{aiml_service_url}/agents/delete/{agent_id}",
-            user_id=user_id
+        response = await forward_request('delete', f"{aiml_service_url}/agents/delete/{agent_id}",
+            user_id=user_id,
+            passthrough=True
         )
+        invalidate_agent(agent_id)
+        return response
     except Exception as e:
         await handle_request_error(e, delete_agent, request)
 
@@ -80,9 +177,24 @@ async def get_approved_agents(
     skip: int = 0,
     sort_by: str = Query("created_at"),
     sort_order: int = Query(-1),
+    cursor: dict = Depends(cursor_query),
     user: dict = Depends(get_current_user)
 ):
     try:
+        if cursor is not None:
+            return await forward_cursor_page(
+                'get', 
+                f"{aiml_service_url}/agents/get_approved",
+                cursor,
+                params={
+                    'limit': limit, 
+                    'skip': skip, 
+                    'sort_by': sort_by, 
+                    'sort_order': sort_order,
+                    'user_id': user.get('sub')  # Add user_id to params
+                },
+                sort_order=sort_order
+            )
         return await forward_request(
             'get', 
             f"{aiml_service_url}/agents/get_approved",
@@ -92,7 +204,8 @@ async def get_approved_agents(
                 'sort_by': sort_by, 
                 'sort_order': sort_order,
                 'user_id': user.get('sub')  # Add user_id to params
-            }
+            },
+            passthrough=True
         )
     except Exception as e:
         await handle_request_error(e, get_approved_agents, request)
@@ -104,9 +217,24 @@ async def get_system_agents(
     skip: int = 0,
     sort_by: str = Query("created_at"),
     sort_order: int = Query(-1),
+    cursor: dict = Depends(cursor_query),
     user: dict = Depends(get_current_user)
 ):
     try:
+        if cursor is not None:
+            return await forward_cursor_page(
+                'get', 
+                f"{aiml_service_url}/agents/get_system",
+                cursor,
+                params={
+                    'limit': limit, 
+                    'skip': skip, 
+                    'sort_by': sort_by, 
+                    'sort_order': sort_order,
+                    'user_id': user.get('sub')  # Add user_id to params
+                },
+                sort_order=sort_order
+            )
         return await forward_request(
             'get', 
             f"{aiml_service_url}/agents/get_system",
@@ -116,7 +244,8 @@ async def get_system_agents(
                 'sort_by': sort_by, 
                 'sort_order': sort_order,
                 'user_id': user.get('sub')  # Add user_id to params
-            }
+            },
+            passthrough=True
         )
     except Exception as e:
         await handle_request_error(e, get_system_agents, request)
@@ -129,11 +258,19 @@ async def get_user_agents(
     skip: int = 0,
     sort_by: str = "created_at",
     sort_order: int = -1,
+    cursor: dict = Depends(cursor_query),
     user: dict = Depends(get_current_user)
 ):
     try:
+        if cursor is not None:
+            return await forward_cursor_page('get', f"{aiml_service_url}/agents/get_user_nonprivate/{user_id}",
+                cursor,
+                params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order},
+                sort_order=sort_order
+            )
         return await forward_request('get', f"{aiml_service_url}/agents/get_user_nonprivate/{user_id}",
-            params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order}
+            params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order},
+            passthrough=True
         )
     except Exception as e:
         await handle_request_error(e, get_user_agents, request)
@@ -145,13 +282,22 @@ async def get_private_agents(
     skip: int = 0,
     sort_by: str = Query("created_at"),
     sort_order: int = Query(-1),
+    cursor: dict = Depends(cursor_query),
     user: dict = Depends(get_current_user)
 ):
     try:
         user_id = user.get("sub")
+        if cursor is not None:
+            return await forward_cursor_page('get', f"{aiml_service_url}/agents/get_user/{user_id}",
+                cursor,
+                params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order},
+                user_id=user_id,
+                sort_order=sort_order
+            )
         return await forward_request('get', f"{aiml_service_url}/agents/get_user/{user_id}",
             params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order},
-            user_id=user_id
+            user_id=user_id,
+            passthrough=True
         )
     except Exception as e:
         await handle_request_error(e, get_private_agents, request)
@@ -164,11 +310,66 @@ async def get_agent_details(
 ):
     try:
         return await forward_request('get', f"{aiml_service_url}/agents/get/{agent_id}",
-            user_id=user.get('sub')
+            user_id=user.get('sub'),
+            passthrough=True
         )
     except Exception as e:
         await handle_request_error(e, get_agent_details, request)
 
+@router.post("/get_many")
+async def get_many_agents(
+    request: Request,
+    agent_ids: list = Body(..., embed=True, description="IDs of the agents to retrieve"),
+    user: dict = Depends(get_current_user)
+):
+    try:
+        user_id = user.get('sub')
+        unique_ids = list(dict.fromkeys(str(agent_id) for agent_id in agent_ids))
+        max_ids = config.get("agents.get_many_max_ids", 100)
+        if len(unique_ids) > max_ids:
+            raise HTTPException(status_code=400, detail={
+                "message": f"At most {max_ids} agents can be retrieved at once.",
+                "error": "Too many agent IDs"
+            })
+
+        agents = {}
+        errors = {}
+        missing = []
+        for agent_id in unique_ids:
+            agent = agent_cache.get(agent_id)
+            if agent is not None and visible_to(agent, user_id):
+                agents[agent_id] = agent
+            else:
+                missing.append(agent_id)
+
+        semaphore = asyncio.Semaphore(config.get("agents.get_many_concurrency", 8))
+
+        async def fetch(agent_id):
+            async with semaphore:
+                try:
+                    payload = await forward_request('get', f"{aiml_service_url}/agents/get/{agent_id}", user_id=user_id)
+                except HTTPException as e:
+                    errors[agent_id] = {"status_code": e.status_code, "detail": e.detail}
+                    return
+            agent = payload.get('data') if isinstance(payload, dict) else None
+            if not agent:
+                errors[agent_id] = {"status_code": 404, "detail": "Agent not found"}
+                return
+            agent_cache.set(agent_id, agent)
+            remember_agent({'_id': agent_id, **agent})
+            agents[agent_id] = agent
+
+        await asyncio.gather(*(fetch(agent_id) for agent_id in missing))
+        return MongoJSONResponse({
+            "message": "Agents retrieved successfully",
+            "data": {agent_id: agents[agent_id] for agent_id in unique_ids if agent_id in agents},
+            "errors": errors
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        await handle_request_error(e, get_many_agents, request)
+
 @router.get("/tools")
 async def get_available_tools(
     request: Request = None,
@@ -176,7 +377,8 @@ async def get_available_tools(
 ):
     try:
         return await forward_request('get', f"{aiml_service_url}/agents/tools",
-            user_id=user.get('sub')
+            user_id=user.get('sub'),
+            passthrough=True
         )
     except Exception as e:
         await handle_request_error(e, get_available_tools, request)
@@ -186,12 +388,19 @@ async def update_agent(
     request: Request,
     agent_id: str,
     body: dict = Body(...),
+    version: str = Query(None, description="Expected agent version (its version or updated_at); the update fails with 412 if the agent has changed since"),
     user: dict = Depends(get_current_user)
 ):
     try:
-        # Get the current agent details first
-        current_agent = await forward_request('get', f"{aiml_service_url}/agents/get/{agent_id}", user_id=user.get('sub'))
-        current_agent = current_agent.get('data', {})
+        # Type usually comes from the metadata cache, saving a full pre-read. The
+        # cache is per worker and misses edits made elsewhere, so a version
+        # check or a type change always reads the agent fresh
+        current_agent, _ = await agent_metadata(agent_id, user.get('sub'), refresh=version is not None or 'agent_type' in body)
+        if version is not None and current_agent['version'] != version:
+            raise HTTPException(status_code=412, detail={
+                "message": "The agent was modified by someone else. Reload it and try again.",
+                "error": "Version mismatch"
+            })
         
         # Security checks
         if current_agent.get('agent_type') == 'system':
@@ -219,13 +428,22 @@ async def update_agent(
                     "error": "Unauthorized type change"
                 })
 
-        # Forward the update request with the user's ID
-        return await forward_request(
+        # Forward the update request with the user's ID; If-Match (the client's,
+        # or the expected version) lets AIML reject the write atomically if the
+        # agent changed after the check above
+        if_match = request.headers.get('if-match') or (f'"{version}"' if version is not None else None)
+        response = await forward_request(
             'put',
             f"{aiml_service_url}/agents/update/{agent_id}",
             params={'user_id': user.get('sub')},
-            json=body
+            json=body,
+            headers={'If-Match': if_match} if if_match else None,
+            passthrough=True
         )
+        # Drop the stale entries; the refresh re-adds it if it is still listed
+        invalidate_agent(agent_id)
+        agent_index_refresher.request_refresh()
+        return response
 
     except HTTPException:
         raise
@@ -241,9 +459,54 @@ async def search_agent(
     types: list = Query([], description="Agent types to filter (e.g., public, private, approved, system)"),
     sort_by: str = Query("created_at", description="Field to sort results by"),
     sort_order: int = Query(-1, description="Sort order (-1 for descending, 1 for ascending)"),
+    cursor: dict = Depends(cursor_query),
     user: dict = Depends(get_current_user)
 ):
     try:
+        if cursor is not None:
+            return await forward_cursor_page(
+                'get',
+                f"{aiml_service_url}/agents/search",
+                cursor,
+                params={
+                    'query': query,
+                    'limit': limit,
+                    'skip': skip,
+                    'types': types,
+                    'sort_by': sort_by,
+                    'sort_order': sort_order,
+                    'user_id': user.get('sub')  # Add user_id to params
+                },
+                sort_order=sort_order
+            )
+        if agent_index_refresher.ready:
+            # Listed agents come from the local index; only the user's private
+            # agents need a live upstream search
+            listed_types = [t for t in types if t in LISTED_TYPES] if types else list(LISTED_TYPES)
+            with span("index", "agent search"):
+                matches = agent_index.search(query, listed_types) if listed_types else []
+            if not types or 'private' in types:
+                private = await forward_request(
+                    'get',
+                    f"{aiml_service_url}/agents/search",
+                    params={
+                        'query': query,
+                        'limit': skip + limit,
+                        'skip': 0,
+                        'types': ['private'],
+                        'sort_by': sort_by,
+                        'sort_order': sort_order,
+                        'user_id': user.get('sub')
+                    }
+                )
+                matches += [(score_agent(agent, query), agent) for agent in page_items(private) or []
+                            if agent.get('agent_type') == 'private']
+            ranked = rank(matches, len(matches), 0, sort_by, sort_order)
+            agents = await still_listed(ranked, skip + limit, user.get('sub'))
+            return MongoJSONResponse({
+                "message": "Agents retrieved successfully",
+                "data": agents[skip:skip + limit]
+            })
         return await forward_request(
             'get',
             f"{aiml_service_url}/agents/search",
@@ -255,7 +518,8 @@ async def search_agent(
                 'sort_by': sort_by,
                 'sort_order': sort_order,
                 'user_id': user.get('sub')  # Add user_id to params
-            }
+            },
+            passthrough=True
         )
     except Exception as e:
         await handle_request_error(e, search_agent, request)
@@ -1,12 +1,14 @@
 from fastapi import APIRouter, HTTPException, Request, Body, Depends
 from fastapi.responses import StreamingResponse
-import httpx
 from keys.keys import aiml_service_url
 from dependencies.auth import get_current_user
-from utilities.forward import forward_request
+from utilities.forward import forward_request, get_stream_client
 from utilities.error_handler import handle_request_error
 from bson import ObjectId
-from database.mongo import client as mongo_client
+from database.mongo import get_client
+from utilities.metrics import sse_active_streams, sse_streamed_bytes
+from utilities.timing import span
+from utilities.json_encoder import MongoJSONResponse
 
 router = APIRouter()
 
@@ -22,8 +24,9 @@ async def chat(
     user: dict = Depends(get_current_user)
 ):
     try:
-        db = mongo_client.ai
-        session_doc = db.sessions.find_one({"_id": ObjectId(session_id)})
+        db = get_client().ai
+        with span("mongo", "session lookup"):
+            session_doc = db.sessions.find_one({"_id": ObjectId(session_id)})
         if not session_doc:
             raise HTTPException(status_code=404, detail="Session not found")
         if session_doc.get("session_type") == "team":
@@ -41,17 +44,24 @@ async def chat(
         }
         if stream:
             async def stream_bytes():
-                async with httpx.AsyncClient(timeout=None) as client:  # Disable timeouts
-                    async with client.stream('POST', url, params={**params, "user_id": user_id}, json=body) as response:
+                active_streams = sse_active_streams.labels("agent")
+                streamed_bytes = sse_streamed_bytes.labels("agent")
+                active_streams.inc()
+                try:
+                    client = get_stream_client()
+                    async with client.stream('POST', url, params={**params, "user_id": user_id}, json=body, timeout=None) as response:  # Disable timeouts
                         async for chunk in response.aiter_bytes():
+                            streamed_bytes.inc(len(chunk))
                             yield chunk
+                finally:
+                    active_streams.dec()
             return StreamingResponse(
                 stream_bytes(),
                 media_type='text/event-stream',
                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
             )
         else:
-            return await forward_request('post', url, user_id=user_id, params=params, json=body)
+            return await forward_request('post', url, user_id=user_id, params=params, json=body, passthrough=True)
     except Exception as e:
         await handle_request_error(e, chat, request)
 
@@ -66,8 +76,9 @@ async def team_chat(
     user: dict = Depends(get_current_user)
 ):
     try:
-        db = mongo_client.ai
-        session_doc = db.sessions.find_one({"_id": ObjectId(session_id)})
+        db = get_client().ai
+        with span("mongo", "session lookup"):
+            session_doc = db.sessions.find_one({"_id": ObjectId(session_id)})
         if not session_doc:
             raise HTTPException(status_code=404, detail="Session not found")
         
@@ -94,10 +105,17 @@ async def team_chat(
         
         if stream:
             async def stream_bytes():
-                async with httpx.AsyncClient(timeout=None) as client:
-                    async with client.stream('POST', url, params=params, json=request_body) as response:
+                active_streams = sse_active_streams.labels("team")
+                streamed_bytes = sse_streamed_bytes.labels("team")
+                active_streams.inc()
+                try:
+                    client = get_stream_client()
+                    async with client.stream('POST', url, params=params, json=request_body, timeout=None) as response:
                         async for chunk in response.aiter_bytes():
+                            streamed_bytes.inc(len(chunk))
                             yield chunk
+                finally:
+                    active_streams.dec()
             return StreamingResponse(
                 stream_bytes(),
                 media_type='text/event-stream',
@@ -106,8 +124,8 @@ async def team_chat(
         else:
             response = await forward_request('post', url, params=params, json=request_body)
             if isinstance(response, dict) and "data" in response:
-                return response["data"]
-            return response
+                return MongoJSONResponse(response["data"])
+            return MongoJSONResponse(response)
             
     except Exception as e:
         await handle_request_error(e, team_chat, request)
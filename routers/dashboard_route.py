@@ -0,0 +1,60 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Request, Depends
+from keys.keys import aiml_service_url
+from dependencies.auth import get_current_user
+from utilities.forward import forward_request
+from utilities.error_handler import handle_request_error
+from utilities.json_encoder import MongoJSONResponse
+from utilities.settings import config
+
+router = APIRouter()
+
+def dashboard_sections(user_id, limit):
+    """Section name -> (AIML path, params) for everything the home screen loads."""
+    listing = {'limit': limit, 'skip': 0, 'sort_by': 'created_at', 'sort_order': -1}
+    return {
+        "team_sessions": (f"/sessions/get_all_team/{user_id}", listing),
+        "standalone_sessions": (f"/sessions/get_all_standalone/{user_id}", listing),
+        "own_agents": (f"/agents/get_user/{user_id}", {**listing, 'user_id': user_id}),
+        "system_agents": ("/agents/get_system", {**listing, 'user_id': user_id}),
+        "tools": ("/agents/tools", {'user_id': user_id}),
+    }
+
+@router.get("")
+async def get_dashboard(
+    request: Request,
+    limit: int = 20,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Everything the home screen needs in one request: the upstream calls run
+    concurrently, and a section that fails is reported in `errors` instead of
+    failing the whole response.
+    """
+    try:
+        user_id = user.get("sub")
+        timeout = config.get("dashboard.section_timeout_s", 10)
+        sections = dashboard_sections(user_id, limit)
+        data = {}
+        errors = {}
+
+        async def load(name, path, params):
+            try:
+                payload = await asyncio.wait_for(
+                    forward_request('get', f"{aiml_service_url}{path}", params=dict(params)),
+                    timeout
+                )
+                data[name] = payload.get("data") if isinstance(payload, dict) else payload
+            except HTTPException as e:
+                errors[name] = {"status_code": e.status_code, "detail": e.detail}
+            except asyncio.TimeoutError:
+                errors[name] = {"status_code": 504, "detail": f"No response within {timeout} seconds"}
+
+        await asyncio.gather(*(load(name, path, params) for name, (path, params) in sections.items()))
+        return MongoJSONResponse({
+            "message": "Dashboard retrieved successfully",
+            "data": {name: data.get(name) for name in sections},
+            "errors": errors
+        })
+    except Exception as e:
+        await handle_request_error(e, get_dashboard, request)
@@ -1,9 +1,19 @@
-from fastapi import APIRouter, HTTPException, Request, Query, Depends
+import asyncio
+from time import time
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Request, Query, Body, Depends
+from fastapi.responses import StreamingResponse
 from dependencies.auth import get_current_user
 from keys.keys import aiml_service_url
-from utilities.forward import forward_request
-from utilities.s3_loader import generate_download_link, generate_unique_filename, generate_upload_url
-import boto3
+from utilities.forward import forward_request, request_not_sent
+from utilities.pagination import cursor_query, forward_cursor_page
+from utilities.s3_loader import generate_download_link, generate_unique_filename, generate_upload_url, delete_from_s3, delete_many_from_s3, object_exists
+from utilities.settings import config
+from database.mongo import get_client
+from utilities.task_queue import task_queue, TaskRetry, TaskFailed
+from utilities.json_encoder import MongoJSONResponse, dumps
+from utilities.job_watcher import job_watcher
+from utilities.metrics import sse_active_streams
 from errors.error_logger import log_exception_with_request   # <-- new import
 
 router = APIRouter()
@@ -18,6 +28,34 @@ ALLOWED_FILE_TYPES = {
 
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
+async def check_upload(file_name, file_type, file_size, agent_id, user_id):
+    """Validate an upload request and return the S3 key to upload to"""
+    # Validate file type
+    if file_type not in ALLOWED_FILE_TYPES:
+        raise HTTPException(status_code=400, detail=f"File type {file_type} not allowed")
+    
+    # Convert MB to bytes and validate
+    file_size = file_size * 1024 * 1024
+    if file_size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=400, detail=f"File size exceeds maximum limit of {MAX_FILE_SIZE/1024/1024}MB")
+
+    # Check for duplicate file name
+    existing_files = await forward_request(
+        'get',
+        f"{aiml_service_url}/files/files/all/{agent_id}",
+        params={'user_id': user_id}
+    )
+    
+    if existing_files.get('data'):
+        for file in existing_files['data']:
+            if file['filename'].lower() == file_name.lower():
+                raise HTTPException(status_code=409, detail={
+                    "message": "File with this name already exists",
+                    "existing_file_id": str(file['_id'])
+                })
+
+    return f"files/{user_id}/{generate_unique_filename(file_name)}"
+
 @router.post("/upload/generate_url")
 async def generate_upload_url_endpoint(
     request: Request,
@@ -28,32 +66,8 @@ async def generate_upload_url_endpoint(
     user: dict = Depends(get_current_user)
 ):
     try:
-        # Validate file type
-        if file_type not in ALLOWED_FILE_TYPES:
-            raise HTTPException(status_code=400, detail=f"File type {file_type} not allowed")
-        
-        # Convert MB to bytes and validate
-        file_size = file_size * 1024 * 1024
-        if file_size > MAX_FILE_SIZE:
-            raise HTTPException(status_code=400, detail=f"File size exceeds maximum limit of {MAX_FILE_SIZE/1024/1024}MB")
-
-        # Check for duplicate file name
-        existing_files = await forward_request(
-            'get',
-            f"{aiml_service_url}/files/files/all/{agent_id}",
-            params={'user_id': user.get('sub')}
-        )
-        
-        if existing_files.get('data'):
-            for file in existing_files['data']:
-                if file['filename'].lower() == file_name.lower():
-                    raise HTTPException(status_code=409, detail={
-                        "message": "File with this name already exists",
-                        "existing_file_id": str(file['_id'])
-                    })
-
         # Generate S3 key and presigned URL
-        s3_key = f"files/{user.get('sub')}/{generate_unique_filename(file_name)}"
+        s3_key = await check_upload(file_name, file_type, file_size, agent_id, user.get('sub'))
         return {
             "message": "Upload URL generated successfully",
             **generate_upload_url(file_name, s3_key)
@@ -64,6 +78,122 @@ async def generate_upload_url_endpoint(
         log_exception_with_request(e, generate_upload_url_endpoint, request)
         raise HTTPException(status_code=500, detail=str(e))
 
+def find_started_job(s3_key, user_id):
+    """The processing job already started for this upload, if any."""
+    return get_client().jobs.files.find_one({"s3_key": s3_key, "user_id": user_id}, {"_id": 1})
+
+@task_queue.handler("process_upload")
+async def process_upload_task(payload):
+    """Start processing once the upload is in S3, checking with HEAD at growing intervals until the URL expires."""
+    if not await asyncio.to_thread(object_exists, payload['s3_key'], bucket_name=payload['s3_bucket']):
+        waited = time() - payload['registered_at']
+        if waited > payload['expires_in']:
+            raise TaskFailed("The file was not uploaded before the upload URL expired")
+        delay = min(config.get("files.upload_poll_max_s", 30), max(config.get("files.upload_poll_min_s", 1), waited / 4))
+        raise TaskRetry(delay, "Waiting for the upload to complete")
+
+    # Starting a job is not idempotent: a retry, or a re-run after the lease
+    # expired, must not start a second one for the same upload
+    existing = await asyncio.to_thread(find_started_job, payload['s3_key'], payload['user_id'])
+    if existing is not None:
+        return {"message": "File processing already started", "job_id": str(existing["_id"])}
+    try:
+        return await forward_request(
+            'post',
+            f"{aiml_service_url}/files/jobs/start",
+            params={
+                'file_name': payload['file_name'],
+                'file_type': payload['file_type'],
+                'agent_id': payload['agent_id'],
+                'collection_index': payload['collection_index'],
+                'chunk_size': payload['chunk_size'],
+                'overlap': payload['overlap'],
+                'chunk_type': payload['chunk_type'],
+                'user_id': payload['user_id'],
+                's3_bucket': payload['s3_bucket'],
+                's3_key': payload['s3_key']
+            }
+        )
+    except HTTPException as e:
+        if request_not_sent(e):
+            raise
+        if e.status_code < 500:
+            raise TaskFailed(f"Starting file processing failed: {e.detail}")
+        # AIML may have started the job before failing or timing out, so retrying could start a second one
+        raise TaskFailed(f"Starting file processing failed, and the job may or may not have started: {e.detail}")
+
+@router.post("/upload/start")
+async def start_upload(
+    request: Request,
+    file_name: str = Query(...),
+    file_type: str = Query(...),
+    file_size: int = Query(...),
+    agent_id: str = Query(...),
+    collection_index: int = Query(None),
+    chunk_size: int = Query(3),
+    overlap: int = Query(1),
+    chunk_type: str = Query("sentence"),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Generate an upload URL and register the processing job in one call.
+    Processing starts by itself once the file is in S3; call
+    /upload/complete/{task_id} after the PUT to skip the wait.
+    """
+    try:
+        user_id = user.get('sub')
+        s3_key = await check_upload(file_name, file_type, file_size, agent_id, user_id)
+        expires_in = config.get("files.upload_url_expiration_s", 3600)
+        upload = generate_upload_url(file_name, s3_key, expiration=expires_in)
+        task = await task_queue.enqueue("process_upload", {
+            "s3_key": s3_key,
+            "s3_bucket": upload['s3_bucket'],
+            "file_name": file_name,
+            "file_type": file_type,
+            "agent_id": agent_id,
+            "collection_index": collection_index,
+            "chunk_size": chunk_size,
+            "overlap": overlap,
+            "chunk_type": chunk_type,
+            "user_id": user_id,
+            "registered_at": time(),
+            "expires_in": expires_in
+        }, user_id=user_id)
+        return {
+            "message": "Upload URL generated successfully",
+            **upload,
+            "task_id": str(task["_id"]),
+            "status_url": f"/tasks/{task['_id']}"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_with_request(e, start_upload, request)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/upload/complete/{task_id}")
+async def complete_upload(
+    request: Request,
+    task_id: str,
+    user: dict = Depends(get_current_user)
+):
+    """Tell the server an upload from /upload/start has finished so processing starts now"""
+    try:
+        if not ObjectId.is_valid(task_id):
+            raise HTTPException(status_code=400, detail="Invalid task ID")
+        if not await task_queue.wake(task_id, user_id=user.get('sub')):
+            raise HTTPException(status_code=404, detail="No upload waiting for this task")
+        return MongoJSONResponse({
+            "message": "Upload completion received",
+            "task_id": task_id,
+            "status_url": f"/tasks/{task_id}"
+        }, status_code=202)
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_with_request(e, complete_upload, request)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/process")
 async def process_file(
     request: Request,
@@ -94,7 +224,8 @@ async def process_file(
                 'user_id': user.get('sub'),
                 's3_bucket': 'infinite-v2-data',
                 's3_key': s3_key
-            }
+            },
+            passthrough=True
         )
         
         return response
@@ -137,13 +268,28 @@ async def get_download_url(
         log_exception_with_request(e, get_download_url, request)
         raise HTTPException(status_code=500, detail=str(e))
 
+@task_queue.handler("delete_file")
+async def delete_file_task(payload):
+    """Remove a file's AIML record and S3 object. Safe to retry: already deleted counts as done."""
+    try:
+        await forward_request(
+            'delete',
+            f"{aiml_service_url}/files/{payload['agent_id']}/{payload['file_id']}",
+            params={'user_id': payload['user_id']}
+        )
+    except HTTPException as e:
+        if e.status_code != 404:
+            raise
+    if payload.get('s3_key'):
+        await asyncio.to_thread(delete_from_s3, payload['s3_key'], bucket_name=payload['s3_bucket'])
+
 @router.delete("/delete/{file_id}")
 async def delete_file(
     request: Request,
     file_id: str,
     user: dict = Depends(get_current_user)
 ):
-    """Delete a file and its associated chunks"""
+    """Delete a file and its associated chunks. The deletion runs as a background task."""
     try:
         # Get file details using the correct endpoint
         file_details = await forward_request(
@@ -152,53 +298,122 @@ async def delete_file(
             params={'user_id': user.get('sub')}
         )
         
-        errors = []
         agent_id = file_details.get("agent_id")
         if not agent_id:
             raise HTTPException(status_code=400, detail="Missing agent_id in file details.")
         
-        # Delete from AIML service using the correct deletion route
-        try:
-            await forward_request(
-                'delete',
-                f"{aiml_service_url}/files/{agent_id}/{file_id}",
-                params={'user_id': user.get('sub')}
-            )
-        except Exception as e:
-            errors.append(f"Failed to delete from AIML service: {str(e)}")
-        
-        # If it's not a webpage, delete from S3
-        if file_details.get('file_type') != 'webpage':
-            try:
-                s3_client = boto3.client('s3')
-                s3_client.delete_object(
-                    Bucket=file_details.get('s3_bucket', 'infinite-v2-data'),
-                    Key=file_details.get('s3_key')
-                )
-            except Exception as e:
-                errors.append(f"Failed to delete from S3: {str(e)}")
+        # Webpages have nothing in S3
+        is_webpage = file_details.get('file_type') == 'webpage'
+        task = await task_queue.enqueue("delete_file", {
+            "file_id": file_id,
+            "agent_id": agent_id,
+            "user_id": user.get('sub'),
+            "s3_key": None if is_webpage else file_details.get('s3_key'),
+            "s3_bucket": file_details.get('s3_bucket', 'infinite-v2-data')
+        }, user_id=user.get('sub'))
         
-        if errors:
-            return {
-                "message": "File deletion partially completed with errors",
-                "errors": errors
-            }
-        
-        return {"message": "File deleted successfully"}
+        return MongoJSONResponse({
+            "message": "File deletion queued",
+            "task_id": str(task["_id"]),
+            "status_url": f"/tasks/{task['_id']}"
+        }, status_code=202)
+    except HTTPException:
+        raise
     except Exception as e:
         log_exception_with_request(e, delete_file, request)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/delete_many")
+async def delete_files(
+    request: Request,
+    file_ids: list = Body(..., embed=True, description="IDs of the files to delete"),
+    user: dict = Depends(get_current_user)
+):
+    """Delete many files: AIML records with bounded concurrency, S3 objects in batches"""
+    try:
+        user_id = user.get('sub')
+        unique_ids = list(dict.fromkeys(str(file_id) for file_id in file_ids))
+        max_ids = config.get("files.delete_many_max_ids", 1000)
+        if len(unique_ids) > max_ids:
+            raise HTTPException(status_code=400, detail=f"At most {max_ids} files can be deleted at once")
+
+        semaphore = asyncio.Semaphore(config.get("files.delete_concurrency", 8))
+        results = {file_id: {"status": "deleted", "errors": []} for file_id in unique_ids}
+        s3_keys = {}  # bucket -> [(file_id, key)]
+
+        async def delete_record(file_id):
+            async with semaphore:
+                try:
+                    file_details = await forward_request(
+                        'get',
+                        f"{aiml_service_url}/files/files/get/{file_id}",
+                        params={'user_id': user_id}
+                    )
+                except HTTPException as e:
+                    results[file_id] = {"status": "failed", "errors": [f"File lookup failed: {e.detail}"]}
+                    return
+                agent_id = file_details.get("agent_id")
+                if not agent_id:
+                    results[file_id] = {"status": "failed", "errors": ["Missing agent_id in file details."]}
+                    return
+                try:
+                    await forward_request(
+                        'delete',
+                        f"{aiml_service_url}/files/{agent_id}/{file_id}",
+                        params={'user_id': user_id}
+                    )
+                except HTTPException as e:
+                    results[file_id]["errors"].append(f"Failed to delete from AIML service: {e.detail}")
+            # Webpages and files without a key have nothing in S3; one missing
+            # key would fail parameter validation for the whole batch
+            if file_details.get('file_type') != 'webpage' and file_details.get('s3_key'):
+                bucket = file_details.get('s3_bucket', 'infinite-v2-data')
+                s3_keys.setdefault(bucket, []).append((file_id, file_details.get('s3_key')))
+
+        await asyncio.gather(*(delete_record(file_id) for file_id in unique_ids))
+
+        for bucket, entries in s3_keys.items():
+            failed = await asyncio.to_thread(delete_many_from_s3, [key for _, key in entries], bucket)
+            for file_id, key in entries:
+                if key in failed:
+                    results[file_id]["errors"].append(f"Failed to delete from S3: {failed[key]}")
+
+        for result in results.values():
+            if result["status"] == "deleted" and result["errors"]:
+                result["status"] = "partial"
+        all_deleted = all(result["status"] == "deleted" for result in results.values())
+        return {
+            "message": "Files deleted successfully" if all_deleted else "File deletion partially completed with errors",
+            "data": results
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_with_request(e, delete_files, request)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/files/{agent_id}")
 async def get_agent_files(
     request: Request,
     agent_id: str,
     limit: int = 20,
     skip: int = 0,
+    cursor: dict = Depends(cursor_query),
     user: dict = Depends(get_current_user)
 ):
     """Get all files for an agent"""
     try:
+        if cursor is not None:
+            return await forward_cursor_page(
+                'get',
+                f"{aiml_service_url}/files/files/all/{agent_id}",
+                cursor,
+                params={
+                    'user_id': user.get('sub'),
+                    'limit': limit,
+                    'skip': skip
+                }
+            )
         return await forward_request(
             'get',
             f"{aiml_service_url}/files/files/all/{agent_id}",
@@ -206,7 +421,8 @@ async def get_agent_files(
                 'user_id': user.get('sub'),
                 'limit': limit,
                 'skip': skip
-            }
+            },
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, get_agent_files, request)
@@ -223,7 +439,8 @@ async def get_agent_collections(
         return await forward_request(
             'get',
             f"{aiml_service_url}/files/collections/all/{agent_id}",
-            params={'user_id': user.get('sub')}
+            params={'user_id': user.get('sub')},
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, get_agent_collections, request)
@@ -236,10 +453,22 @@ async def get_collection_files(
     collection_index: int,  # Changed from collection_id to collection_index
     limit: int = 20,
     skip: int = 0,
+    cursor: dict = Depends(cursor_query),
     user: dict = Depends(get_current_user)
 ):
     """Get all files in a collection using collection index"""
     try:
+        if cursor is not None:
+            return await forward_cursor_page(
+                'get',
+                f"{aiml_service_url}/files/collections/files/{agent_id}/{collection_index}",
+                cursor,
+                params={
+                    'user_id': user.get('sub'),
+                    'limit': limit,
+                    'skip': skip
+                }
+            )
         return await forward_request(
             'get',
             f"{aiml_service_url}/files/collections/files/{agent_id}/{collection_index}",
@@ -247,7 +476,8 @@ async def get_collection_files(
                 'user_id': user.get('sub'),
                 'limit': limit,
                 'skip': skip
-            }
+            },
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, get_collection_files, request)
@@ -306,12 +536,56 @@ async def get_job_status(
     try:
         return await forward_request(
             'get',
-            f"{aiml_service_url}/files/jobs/get/{job_id}"
+            f"{aiml_service_url}/files/jobs/get/{job_id}",
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, get_job_status, request)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/jobs/{job_id}/events")
+async def stream_job_status(
+    request: Request,
+    job_id: str,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Stream a file processing job's state as server-sent events: one `job`
+    event now and one per change, ending once the job completes or fails.
+    """
+    try:
+        user_id = user.get('sub')
+        keepalive = config.get("job_watch.keepalive_s", 15)
+
+        async def events():
+            active_streams = sse_active_streams.labels("job")
+            active_streams.inc()
+            queue = job_watcher.subscribe(job_id)
+            try:
+                while True:
+                    try:
+                        job = await asyncio.wait_for(queue.get(), keepalive)
+                    except asyncio.TimeoutError:
+                        yield b": keepalive\n\n"
+                        continue
+                    if job.get("user_id") not in (None, user_id):
+                        job = {"_id": job_id, "status": "not_found"}
+                    yield b"event: job\ndata: " + dumps(job) + b"\n\n"
+                    if job["status"] == "not_found" or job_watcher.is_terminal(job):
+                        return
+            finally:
+                job_watcher.unsubscribe(job_id, queue)
+                active_streams.dec()
+
+        return StreamingResponse(
+            events(),
+            media_type='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    except Exception as e:
+        log_exception_with_request(e, stream_job_status, request)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/file/{file_id}")
 async def get_file_details(
     request: Request,
@@ -323,7 +597,8 @@ async def get_file_details(
         return await forward_request(
             'get',
             f"{aiml_service_url}/files/files/get/{file_id}",
-            params={'user_id': user.get('sub')}
+            params={'user_id': user.get('sub')},
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, get_file_details, request)
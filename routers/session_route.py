@@ -1,7 +1,13 @@
+import asyncio
+import zlib
 from fastapi import APIRouter, HTTPException, Request, Body, Depends, Query
+from fastapi.responses import StreamingResponse
 from keys.keys import aiml_service_url
 from dependencies.auth import get_current_user
-from utilities.forward import forward_request
+from utilities.forward import forward_request, outcome_unknown
+from utilities.pagination import cursor_query, forward_cursor_page, iterate_pages
+from utilities.json_encoder import dumps, MongoJSONResponse
+from utilities.settings import config
 from errors.error_logger import log_exception_with_request   # <-- new import
 
 router = APIRouter()
@@ -24,7 +30,8 @@ async def create_session(
                 'agent_id': agent_id,
                 'max_context_results': max_context_results,
                 'name': name          # Include name in params
-            }
+            },
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, create_session, request)
@@ -41,7 +48,8 @@ async def delete_session(
         return await forward_request(
             'delete',
             f"{aiml_service_url}/sessions/delete/{session_id}",
-            user_id=user_id
+            user_id=user_id,
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, delete_session, request)
@@ -53,20 +61,95 @@ async def get_history(
     session_id: str,
     limit: int = 20,
     skip: int = 0,
+    cursor: dict = Depends(cursor_query),
     user: dict = Depends(get_current_user)
 ):
     try:
         user_id = user.get("sub")
+        if cursor is not None:
+            return await forward_cursor_page(
+                'get',
+                f"{aiml_service_url}/sessions/history/{session_id}",
+                cursor,
+                user_id=user_id,
+                params={'limit': limit, 'skip': skip}
+            )
         return await forward_request(
             'get',
             f"{aiml_service_url}/sessions/history/{session_id}",
             user_id=user_id,
-            params={'limit': limit, 'skip': skip}
+            params={'limit': limit, 'skip': skip},
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, get_history, request)
         raise HTTPException(status_code=500, detail=str(e))
 
+async def next_page(pages):
+    try:
+        return await pages.__anext__()
+    except StopAsyncIteration:
+        return None
+
+async def export_history(url, session_id, user_id, page_size, compress, route_func, request):
+    """
+    Stream a whole history as NDJSON, newest message first, reading upstream a
+    page at a time. The first page is read before responding so a missing or
+    forbidden session still gets a proper error status.
+    """
+    pages = iterate_pages('get', url, page_size=page_size, user_id=user_id)
+    try:
+        first = await next_page(pages) or []
+    except BaseException:
+        await pages.aclose()
+        raise
+
+    async def lines():
+        encoder = zlib.compressobj(wbits=31) if compress else None  # gzip container
+        try:
+            page = first
+            while True:
+                chunk = b"".join(dumps(message) + b"\n" for message in page)
+                yield encoder.compress(chunk) if encoder else chunk
+                page = await next_page(pages)
+                if page is None:
+                    break
+            if encoder:
+                yield encoder.flush()
+        except Exception as e:
+            # Headers are sent; failing the stream leaves the export visibly truncated
+            log_exception_with_request(e, route_func, request)
+            raise
+        finally:
+            await pages.aclose()
+
+    filename = f"session-{session_id}.ndjson" + (".gz" if compress else "")
+    return StreamingResponse(
+        lines(),
+        media_type="application/gzip" if compress else "application/x-ndjson",
+        headers={'Content-Disposition': f'attachment; filename="{filename}"', 'X-Accel-Buffering': 'no'}
+    )
+
+@router.get("/export/{session_id}")
+async def export_session_history(
+    request: Request,
+    session_id: str,
+    page_size: int = Query(100, ge=1, le=500),
+    gzip: bool = False,
+    user: dict = Depends(get_current_user)
+):
+    """Export a session's full history as NDJSON, optionally gzip-compressed"""
+    try:
+        return await export_history(
+            f"{aiml_service_url}/sessions/history/{session_id}",
+            session_id, user.get("sub"), page_size, gzip, export_session_history, request
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_with_request(e, export_session_history, request)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/history/update/{session_id}")
 async def update_history(
     request: Request,
@@ -81,27 +164,118 @@ async def update_history(
             'post',
             f"{aiml_service_url}/sessions/history/update/{session_id}",
             user_id=user_id,
-            json={'role': role, 'content': content}
+            json={'role': role, 'content': content},
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, update_history, request)
         raise HTTPException(status_code=500, detail=str(e))
 
+async def append_history_batch(url, messages, build_body, user_id, ordered):
+    """
+    Append messages one request per message, reusing the pooled upstream
+    connection. Ordered batches go one at a time and stop at the first
+    message not known to be appended, so the history never ends up out of
+    order; unordered ones run with bounded concurrency. Returns a
+    per-message outcome list. A message whose request timed out or lost its
+    response is `unknown`, not `failed`: it may have been appended.
+    """
+    max_messages = config.get("sessions.history_batch_max", 1000)
+    if len(messages) > max_messages:
+        raise HTTPException(status_code=400, detail=f"At most {max_messages} messages can be appended at once")
+
+    results = [None] * len(messages)
+    bodies = []
+    for index, message in enumerate(messages):
+        if not isinstance(message, dict) or not isinstance(message.get("role"), str) or not isinstance(message.get("content"), str):
+            results[index] = {"index": index, "status": "invalid", "status_code": 422, "detail": "Each message needs a string role and content"}
+        else:
+            bodies.append((index, build_body(message)))
+
+    async def append(index, body):
+        try:
+            await forward_request('post', url, user_id=user_id, json=body)
+            results[index] = {"index": index, "status": "appended"}
+        except HTTPException as e:
+            status = "unknown" if outcome_unknown(e) else "failed"
+            results[index] = {"index": index, "status": status, "status_code": e.status_code, "detail": e.detail}
+        return results[index]["status"] == "appended"
+
+    if ordered:
+        if len(bodies) < len(messages):
+            # Appending around an invalid message would reorder the history
+            for index, _ in bodies:
+                results[index] = {"index": index, "status": "skipped"}
+        else:
+            for position, (index, body) in enumerate(bodies):
+                if not await append(index, body):
+                    for later, _ in bodies[position + 1:]:
+                        results[later] = {"index": later, "status": "skipped"}
+                    break
+    else:
+        semaphore = asyncio.Semaphore(config.get("sessions.history_batch_concurrency", 8))
+
+        async def bounded(index, body):
+            async with semaphore:
+                await append(index, body)
+
+        await asyncio.gather(*(bounded(index, body) for index, body in bodies))
+
+    appended = sum(1 for result in results if result["status"] == "appended")
+    return MongoJSONResponse({
+        "message": "History updated successfully" if appended == len(messages) else "History update partially completed with errors",
+        "appended": appended,
+        "results": results
+    })
+
+@router.post("/history/update_many/{session_id}")
+async def update_history_batch(
+    request: Request,
+    session_id: str,
+    messages: list = Body(..., embed=True, description="Messages to append, each with role and content"),
+    ordered: bool = True,
+    user: dict = Depends(get_current_user)
+):
+    """Append many messages to a session's history in one request"""
+    try:
+        return await append_history_batch(
+            f"{aiml_service_url}/sessions/history/update/{session_id}",
+            messages,
+            lambda message: {'role': message['role'], 'content': message['content']},
+            user.get("sub"),
+            ordered
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_with_request(e, update_history_batch, request)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/history/recent/{session_id}")
 async def get_recent_history(
     request: Request,
     session_id: str,
     limit: int = 20,
     skip: int = 0,
+    cursor: dict = Depends(cursor_query),
     user: dict = Depends(get_current_user)
 ):
     try:
         user_id = user.get("sub")
+        if cursor is not None:
+            return await forward_cursor_page(
+                'get',
+                f"{aiml_service_url}/sessions/history/recent/{session_id}",
+                cursor,
+                user_id=user_id,
+                params={'limit': limit, 'skip': skip}
+            )
         return await forward_request(
             'get',
             f"{aiml_service_url}/sessions/history/recent/{session_id}",
             user_id=user_id,
-            params={'limit': limit, 'skip': skip}
+            params={'limit': limit, 'skip': skip},
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, get_recent_history, request)
@@ -114,14 +288,24 @@ async def list_user_sessions(
     skip: int = 0,
     sort_by: str = "created_at",
     sort_order: int = -1,
+    cursor: dict = Depends(cursor_query),
     user: dict = Depends(get_current_user)
 ):
     try:
         user_id = user.get("sub")
+        if cursor is not None:
+            return await forward_cursor_page(
+                'get',
+                f"{aiml_service_url}/sessions/get_all/{user_id}",
+                cursor,
+                params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order},
+                sort_order=sort_order
+            )
         return await forward_request(
             'get',
             f"{aiml_service_url}/sessions/get_all/{user_id}",
-            params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order}
+            params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order},
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, list_user_sessions, request)
@@ -135,15 +319,26 @@ async def list_agent_sessions(
     skip: int = 0,
     sort_by: str = "created_at",
     sort_order: int = -1,
+    cursor: dict = Depends(cursor_query),
     user: dict = Depends(get_current_user)
 ):
     try:
         user_id = user.get("sub")
+        if cursor is not None:
+            return await forward_cursor_page(
+                'get',
+                f"{aiml_service_url}/sessions/get_by_agent/{agent_id}",
+                cursor,
+                user_id=user_id,
+                params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order},
+                sort_order=sort_order
+            )
         return await forward_request(
             'get',
             f"{aiml_service_url}/sessions/get_by_agent/{agent_id}",
             user_id=user_id,
-            params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order}
+            params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order},
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, list_agent_sessions, request)
@@ -163,7 +358,8 @@ async def get_session_details(
             'get',
             f"{aiml_service_url}/sessions/get/{session_id}",
             user_id=user_id,
-            params={'limit': limit, 'skip': skip}
+            params={'limit': limit, 'skip': skip},
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, get_session_details, request)
@@ -189,7 +385,8 @@ async def create_team_session_route(
                 'name': name,
                 'user_id': user_id,
                 'session_type': session_type
-            }
+            },
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, create_team_session_route, request)
@@ -201,20 +398,50 @@ async def get_team_session_history_route(
     session_id: str,
     limit: int = 20,
     skip: int = 0,
+    cursor: dict = Depends(cursor_query),
     user: dict = Depends(get_current_user)
 ):
     try:
         user_id = user.get("sub")
+        if cursor is not None:
+            return await forward_cursor_page(
+                'get',
+                f"{aiml_service_url}/sessions/team/history/{session_id}",
+                cursor,
+                user_id=user_id,
+                params={'limit': limit, 'skip': skip}
+            )
         return await forward_request(
             'get',
             f"{aiml_service_url}/sessions/team/history/{session_id}",
             user_id=user_id,
-            params={'limit': limit, 'skip': skip}
+            params={'limit': limit, 'skip': skip},
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, get_team_session_history_route, request)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/team/export/{session_id}")
+async def export_team_session_history(
+    request: Request,
+    session_id: str,
+    page_size: int = Query(100, ge=1, le=500),
+    gzip: bool = False,
+    user: dict = Depends(get_current_user)
+):
+    """Export a team session's full history as NDJSON, optionally gzip-compressed"""
+    try:
+        return await export_history(
+            f"{aiml_service_url}/sessions/team/history/{session_id}",
+            session_id, user.get("sub"), page_size, gzip, export_team_session_history, request
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_with_request(e, export_team_session_history, request)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/team/history/update/{session_id}")
 async def update_team_session_history_route(
     request: Request,
@@ -237,12 +464,44 @@ async def update_team_session_history_route(
                 "content": content,
                 "user_id": user_id,
                 "summary": summary
-            }
+            },
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, update_team_session_history_route, request)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/team/history/update_many/{session_id}")
+async def update_team_session_history_batch(
+    request: Request,
+    session_id: str,
+    messages: list = Body(..., embed=True, description="Messages to append, each with role, content and optionally agent_id"),
+    summary: bool = False,
+    ordered: bool = True,
+    user: dict = Depends(get_current_user)
+):
+    """Append many messages to a team session's history in one request"""
+    try:
+        user_id = user.get("sub")
+        return await append_history_batch(
+            f"{aiml_service_url}/sessions/team/history/update/{session_id}",
+            messages,
+            lambda message: {
+                "agent_id": message.get("agent_id"),
+                "role": message["role"],
+                "content": message["content"],
+                "user_id": user_id,
+                "summary": summary
+            },
+            user_id,
+            ordered
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_with_request(e, update_team_session_history_batch, request)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/get_all_team")
 async def list_user_team_sessions(
     request: Request,
@@ -250,14 +509,24 @@ async def list_user_team_sessions(
     skip: int = 0,
     sort_by: str = Query("created_at"),
     sort_order: int = Query(-1),
+    cursor: dict = Depends(cursor_query),
     user: dict = Depends(get_current_user)
 ):
     try:
         user_id = user.get("sub")
+        if cursor is not None:
+            return await forward_cursor_page(
+                'get',
+                f"{aiml_service_url}/sessions/get_all_team/{user_id}",
+                cursor,
+                params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order},
+                sort_order=sort_order
+            )
         return await forward_request(
             'get',
             f"{aiml_service_url}/sessions/get_all_team/{user_id}",
-            params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order}
+            params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order},
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, list_user_team_sessions, request)
@@ -270,14 +539,24 @@ async def list_user_standalone_sessions(
     skip: int = 0,
     sort_by: str = Query("created_at"),
     sort_order: int = Query(-1),
+    cursor: dict = Depends(cursor_query),
     user: dict = Depends(get_current_user)
 ):
     try:
         user_id = user.get("sub")
+        if cursor is not None:
+            return await forward_cursor_page(
+                'get',
+                f"{aiml_service_url}/sessions/get_all_standalone/{user_id}",
+                cursor,
+                params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order},
+                sort_order=sort_order
+            )
         return await forward_request(
             'get',
             f"{aiml_service_url}/sessions/get_all_standalone/{user_id}",
-            params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order}
+            params={'limit': limit, 'skip': skip, 'sort_by': sort_by, 'sort_order': sort_order},
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, list_user_standalone_sessions, request)
@@ -296,7 +575,8 @@ async def rename_session(
             'put',
             f"{aiml_service_url}/sessions/rename/{session_id}",
             user_id=user_id,
-            params={'name': name}
+            params={'name': name},
+            passthrough=True
         )
     except Exception as e:
         log_exception_with_request(e, rename_session, request)
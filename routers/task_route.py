@@ -0,0 +1,31 @@
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Request, Depends
+from dependencies.auth import get_current_user
+from utilities.task_queue import task_queue
+from utilities.json_encoder import MongoJSONResponse
+from errors.error_logger import log_exception_with_request
+
+router = APIRouter()
+
+@router.get("/{task_id}")
+async def get_task_status(
+    request: Request,
+    task_id: str,
+    user: dict = Depends(get_current_user)
+):
+    """Get the status of a background task started by one of the user's requests"""
+    try:
+        if not ObjectId.is_valid(task_id):
+            raise HTTPException(status_code=400, detail="Invalid task ID")
+        task = await task_queue.get(task_id, user_id=user.get('sub'))
+        if task is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        return MongoJSONResponse({
+            "message": "Task retrieved successfully",
+            "data": task
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_with_request(e, get_task_status, request)
+        raise HTTPException(status_code=500, detail=str(e))
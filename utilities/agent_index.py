@@ -0,0 +1,310 @@
+import asyncio
+import re
+from time import perf_counter
+from keys.keys import aiml_service_url
+from utilities.forward import forward_request
+from utilities.pagination import page_items
+from utilities.settings import config, get_logger
+from utilities.metrics import Gauge
+
+#! Initialize ---------------------------------------------------------------
+log = get_logger('agent_index_log', 'debug/agent_index.log')
+
+# Listed agent types and the AIML listing endpoint each is refreshed from
+LISTED_TYPES = {
+    "public": "/agents/get_public",
+    "approved": "/agents/get_approved",
+    "system": "/agents/get_system",
+}
+
+# How much a match in each field counts towards an agent's score
+FIELD_WEIGHTS = {"name": 3.0, "capabilities": 2.0, "rules": 1.0}
+
+agent_index_size = Gauge(
+    "agent_index_agents",
+    "Agents held in the local typeahead index, by type.",
+    ("agent_type",),
+    preregister=[(agent_type,) for agent_type in LISTED_TYPES],
+    multiprocess_mode="max")
+
+_TOKEN = re.compile(r"\w+")
+
+def tokenize(text):
+    return _TOKEN.findall(str(text).lower())
+
+def field_text(agent, field):
+    value = agent.get(field)
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(item) for item in value)
+    return str(value) if value is not None else ""
+
+def agent_terms(agent):
+    """Token -> weight for an agent, keeping the best field weight per token."""
+    terms = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(field_text(agent, field)):
+            if terms.get(token, 0) < weight:
+                terms[token] = weight
+    return terms
+
+#! Prefix trie ------------------------------------------------------------------
+class _TrieNode:
+    __slots__ = ("children", "terminal")
+
+    def __init__(self):
+        self.children = {}
+        self.terminal = False
+
+class PrefixTrie:
+    """Set of index tokens supporting prefix completion."""
+
+    def __init__(self):
+        self.root = _TrieNode()
+
+    def add(self, token):
+        node = self.root
+        for char in token:
+            node = node.children.setdefault(char, _TrieNode())
+        node.terminal = True
+
+    def discard(self, token):
+        path = [self.root]
+        for char in token:
+            node = path[-1].children.get(char)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].terminal = False
+        # Prune branches that no longer lead to a token
+        for depth in range(len(token), 0, -1):
+            node = path[depth]
+            if node.terminal or node.children:
+                break
+            del path[depth - 1].children[token[depth - 1]]
+
+    def complete(self, prefix, limit=256):
+        """Up to `limit` tokens starting with `prefix`, shortest first."""
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        tokens = []
+        level = [(prefix, node)]
+        while level and len(tokens) < limit:
+            next_level = []
+            for text, current in level:
+                if current.terminal:
+                    tokens.append(text)
+                    if len(tokens) >= limit:
+                        break
+                next_level.extend((text + char, child) for char, child in current.children.items())
+            level = next_level
+        return tokens
+
+#! Agent index --------------------------------------------------------------------
+class AgentIndex:
+    """
+    In-memory search over listed (public, approved and system) agents: an
+    inverted index from token to agents, and a prefix trie over the tokens so
+    the word being typed matches as a prefix.
+    """
+
+    def __init__(self):
+        self.agents = {}
+        self.postings = {}
+        self.trie = PrefixTrie()
+
+    def __len__(self):
+        return len(self.agents)
+
+    def upsert(self, agent):
+        agent_id = str(agent.get("_id"))
+        self.remove(agent_id)
+        terms = agent_terms(agent)
+        self.agents[agent_id] = (agent, terms)
+        for token, weight in terms.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                self.trie.add(token)
+            posting[agent_id] = weight
+
+    def remove(self, agent_id):
+        entry = self.agents.pop(agent_id, None)
+        if entry is None:
+            return
+        for token in entry[1]:
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(agent_id, None)
+            if not posting:
+                del self.postings[token]
+                self.trie.discard(token)
+
+    def ids_of_type(self, agent_type):
+        return [agent_id for agent_id, (agent, _) in self.agents.items() if agent.get("agent_type") == agent_type]
+
+    def count_by_type(self):
+        counts = {agent_type: 0 for agent_type in LISTED_TYPES}
+        for agent, _ in self.agents.values():
+            agent_type = agent.get("agent_type")
+            if agent_type in counts:
+                counts[agent_type] += 1
+        return counts
+
+    def _token_scores(self, token, prefix):
+        """agent_id -> score for one query token. Exact matches outrank prefix matches."""
+        scores = {}
+        candidates = self.trie.complete(token) if prefix else ([token] if token in self.postings else [])
+        for candidate in candidates:
+            factor = 1.0 if candidate == token else 0.5 + 0.5 * len(token) / len(candidate)
+            for agent_id, weight in self.postings.get(candidate, {}).items():
+                score = weight * factor
+                if scores.get(agent_id, 0) < score:
+                    scores[agent_id] = score
+        return scores
+
+    def search(self, query, types=None):
+        """
+        Scored matches for `query` as (score, agent) pairs. Every query token
+        must match; the last one also matches as a prefix.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        totals = None
+        for position, token in enumerate(tokens):
+            scores = self._token_scores(token, prefix=position == len(tokens) - 1)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {agent_id: totals[agent_id] + score for agent_id, score in scores.items() if agent_id in totals}
+            if not totals:
+                return []
+        results = []
+        for agent_id, score in totals.items():
+            agent = self.agents[agent_id][0]
+            if types and agent.get("agent_type") not in types:
+                continue
+            results.append((score + name_bonus(agent, query), agent))
+        return results
+
+def name_bonus(agent, query):
+    """Boost agents whose name starts with the query, as typed."""
+    return 1.0 if str(agent.get("name", "")).lower().startswith(query.strip().lower()) else 0.0
+
+def score_agent(agent, query):
+    """Score a single agent (e.g. one fetched live) the same way the index would."""
+    index = AgentIndex()
+    index.upsert(agent)
+    matches = index.search(query)
+    return matches[0][0] if matches else 0.0
+
+def rank(matches, limit, skip=0, sort_by="created_at", sort_order=-1):
+    """Order (score, agent) pairs by score, breaking ties by `sort_by`, and slice a page."""
+    matches = sorted(matches, key=lambda match: str(match[1].get(sort_by) or ""), reverse=sort_order == -1)
+    matches.sort(key=lambda match: match[0], reverse=True)
+    return [agent for _, agent in matches[skip:skip + limit]]
+
+#! Refresher ------------------------------------------------------------------------
+class AgentIndexRefresher:
+    """
+    Keeps an AgentIndex in step with AIML. Each cycle reads the listing
+    endpoints newest-updated first and stops at the last seen update, so a
+    quiet cycle costs one small page per type. Every `full_refresh_every`
+    cycles it reads everything and drops agents that are no longer listed.
+    """
+
+    def __init__(self, index, interval_s=60, page_size=100, full_refresh_every=10, user_id=None):
+        self.index = index
+        self.interval = interval_s
+        self.page_size = page_size
+        self.full_refresh_every = full_refresh_every
+        self.user_id = user_id
+        self.watermarks = {}
+        self.ready = False
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def request_refresh(self):
+        """Run an incremental refresh now instead of waiting for the interval."""
+        self._wake.set()
+
+    async def _run(self):
+        cycle = 0
+        while True:
+            full = cycle % self.full_refresh_every == 0
+            start = perf_counter()
+            try:
+                for agent_type in LISTED_TYPES:
+                    await self.refresh_type(agent_type, full)
+                self.ready = True
+                log.debug(f"{'Full' if full else 'Incremental'} agent index refresh took {(perf_counter() - start) * 1000:.0f}ms, {len(self.index)} agents")
+            except Exception as e:
+                log.error(f"Agent index refresh failed: {e}")
+            for agent_type, count in self.index.count_by_type().items():
+                agent_index_size.labels(agent_type).set(count)
+            cycle += 1
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def refresh_type(self, agent_type, full):
+        watermark = None if full else self.watermarks.get(agent_type)
+        newest = self.watermarks.get(agent_type)
+        seen = set()
+        skip = 0
+        while True:
+            payload = await forward_request('get', f"{aiml_service_url}{LISTED_TYPES[agent_type]}", params={
+                'limit': self.page_size,
+                'skip': skip,
+                'sort_by': 'updated_at',
+                'sort_order': -1,
+                'user_id': self.user_id
+            })
+            items = page_items(payload) or []
+            reached_watermark = False
+            for agent in items:
+                if agent.get("agent_type", agent_type) != agent_type:
+                    continue
+                updated_at = str(agent.get("updated_at") or agent.get("created_at") or "")
+                if watermark is not None and updated_at <= watermark:
+                    reached_watermark = True
+                    break
+                self.index.upsert(agent)
+                seen.add(str(agent.get("_id")))
+                if newest is None or updated_at > newest:
+                    newest = updated_at
+            if reached_watermark or len(items) < self.page_size:
+                break
+            skip += self.page_size
+        if full:
+            for agent_id in self.index.ids_of_type(agent_type):
+                if agent_id not in seen:
+                    self.index.remove(agent_id)
+        if newest is not None:
+            self.watermarks[agent_type] = newest
+
+agent_index = AgentIndex()
+agent_index_refresher = AgentIndexRefresher(
+    agent_index,
+    interval_s=config.get("agent_index.refresh_interval_s", 60),
+    page_size=config.get("agent_index.page_size", 100),
+    full_refresh_every=config.get("agent_index.full_refresh_every", 10),
+    user_id=config.get("agent_index.user_id", "system")
+)
@@ -0,0 +1,52 @@
+from collections import OrderedDict
+from time import monotonic
+from utilities.metrics import Counter
+
+cache_requests = Counter(
+    "cache_requests_total",
+    "Lookups in in-process caches, by cache and hit/miss.",
+    ("cache", "result"))
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Bounded LRU mapping whose entries expire `ttl` seconds after they were
+    set. Meant for use from the event loop, so it takes no locks.
+    """
+
+    def __init__(self, name, max_size=1024, ttl=60):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._hits = cache_requests.labels(name, "hit")
+        self._misses = cache_requests.labels(name, "miss")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key, _MISSING)
+        if entry is not _MISSING:
+            value, expires_at = entry
+            if expires_at > monotonic():
+                self._entries.move_to_end(key)
+                self._hits.inc()
+                return value
+            del self._entries[key]
+        self._misses.inc()
+        return default
+
+    def set(self, key, value):
+        self._entries[key] = (value, monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key):
+        entry = self._entries.pop(key, None)
+        return entry[0] if entry is not None else None
+
+    def clear(self):
+        self._entries.clear()
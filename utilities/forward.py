@@ -1,12 +1,69 @@
 import httpx
 from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
 from json.decoder import JSONDecodeError  # new import
-from bson import ObjectId  # new import
 import asyncio  # new import
+from time import perf_counter
+from urllib.parse import urlsplit
+from utilities.metrics import aiml_request_duration, normalize_path
+from utilities.timing import span
+from utilities.json_encoder import loads, MongoJSONResponse
+from utilities.settings import config
 
-async def forward_request(method: str, url: str, user_id: str = None, **kwargs):
+# Upstream headers worth relaying in passthrough mode
+PASSTHROUGH_HEADERS = ("content-type", "content-encoding", "content-length", "etag", "last-modified")
+
+# One pooled client per process, created on first use and closed in the app
+# lifespan, so connections and the TLS context are reused across requests.
+# Chat streams get a client of their own: each open stream holds a connection
+# for its whole lifetime, and must not starve short requests of the shared pool
+_http_client = None
+_stream_client = None
+
+def get_http_client():
+    """Return the shared AIML client, creating it on first use."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            # Use a custom timeout with read disabled:
+            timeout=httpx.Timeout(connect=60.0, read=None, write=60.0, pool=60.0),
+            limits=httpx.Limits(
+                max_connections=config.get("http.max_connections", 200),
+                max_keepalive_connections=config.get("http.max_keepalive_connections", 50),
+                keepalive_expiry=config.get("http.keepalive_expiry", 30)
+            )
+        )
+    return _http_client
+
+def get_stream_client():
+    """Return the AIML client for long-lived chat streams, creating it on first use."""
+    global _stream_client
+    if _stream_client is None:
+        _stream_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(connect=60.0, read=None, write=60.0, pool=60.0),
+            limits=httpx.Limits(
+                max_connections=config.get("http.stream_max_connections", 200),
+                max_keepalive_connections=config.get("http.stream_max_keepalive_connections", 20),
+                keepalive_expiry=config.get("http.keepalive_expiry", 30)
+            )
+        )
+    return _stream_client
+
+async def close_http_client():
+    """Close the shared clients if they were created."""
+    global _http_client, _stream_client
+    clients, _http_client, _stream_client = (_http_client, _stream_client), None, None
+    for client in clients:
+        if client is not None:
+            await client.aclose()
+
+async def forward_request(method: str, url: str, user_id: str = None, passthrough: bool = False, **kwargs):
     """
     A shared method to forward an HTTP request to the AIML service.
+
+    With passthrough=True the upstream body is streamed to the client as raw
+    bytes without being decoded; callers that need to inspect the payload
+    leave it off and get the parsed JSON back.
     """
     MAX_RETRIES = 5  # new constant
     DELAY_SECONDS = 1  # new constant
@@ -17,21 +74,41 @@ async def forward_request(method: str, url: str, user_id: str = None, **kwargs):
             kwargs['params'] = {}
         kwargs['params']['user_id'] = user_id
 
-    # Use a custom timeout with read disabled:
-    custom_timeout = httpx.Timeout(connect=60.0, read=None, write=60.0, pool=60.0)
+    if passthrough:
+        # The body is relayed with its Content-Encoding as-is, and the shared
+        # client would otherwise accept br/zstd that the real client may not
+        # decode. Ask for an unencoded body and let CompressionMiddleware
+        # negotiate with the client instead
+        kwargs['headers'] = {**(kwargs.get('headers') or {}), 'Accept-Encoding': 'identity'}
+
+    client = get_http_client()
+    metric_path = normalize_path(urlsplit(url).path)
 
     for attempt in range(MAX_RETRIES):
         try:
-            async with httpx.AsyncClient(timeout=custom_timeout) as client:  # Disable timeouts, wait forever
-                response = await getattr(client, method)(url, **kwargs)
-                response.raise_for_status()
-                # Check if the response content is empty
-                if response.content:
-                    data = response.json()
-                    return convert_object_ids(data)  # convert ObjectIds
-                else:
-                    # Return an empty dictionary if the response is empty
-                    return {}
+            start = perf_counter()
+            status = "error"
+            description = f"{method.upper()} {metric_path}" + (f" retry {attempt}" if attempt else "")
+            try:
+                with span("aiml", description):
+                    request = client.build_request(method.upper(), url, **kwargs)
+                    response = await client.send(request, stream=passthrough)
+                status = str(response.status_code)
+            finally:
+                aiml_request_duration.labels(method, metric_path, status).observe(perf_counter() - start)
+            if passthrough:
+                if response.is_error:
+                    await response.aread()  # Error details are needed below
+                    await response.aclose()
+                    response.raise_for_status()
+                return await passthrough_response(response)
+            response.raise_for_status()
+            # Check if the response content is empty
+            if response.content:
+                return loads(response.content)
+            else:
+                # Return an empty dictionary if the response is empty
+                return {}
         except httpx.ConnectError as e:
             if attempt == MAX_RETRIES - 1:
                 raise HTTPException(status_code=503, detail=f"Service unreachable after {MAX_RETRIES} attempts: {e}")
@@ -52,12 +129,40 @@ async def forward_request(method: str, url: str, user_id: str = None, **kwargs):
         except Exception as err:
             raise HTTPException(status_code=500, detail=str(err))
 
-def convert_object_ids(obj):
-    if isinstance(obj, dict):
-        return {k: convert_object_ids(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_object_ids(item) for item in obj]
-    elif isinstance(obj, ObjectId):
-        return str(obj)
-    else:
-        return obj
\ No newline at end of file
+def request_not_sent(error):
+    """Whether forward_request failed before AIML received the request (it could not connect)."""
+    return error.status_code == 503 and str(error.detail).startswith("Service unreachable")
+
+def outcome_unknown(error):
+    """
+    Whether a write that failed with `error` may still have been applied
+    upstream: the request was sent but the response was lost (a timeout or
+    transport error) or a gateway gave up waiting.
+    """
+    return (error.status_code == 503 and not request_not_sent(error)) or error.status_code == 504
+
+class PassthroughResponse(StreamingResponse):
+    """
+    Streams an open upstream response as-is. The upstream response is closed,
+    returning its connection to the shared pool, once sending ends for any
+    reason, including a client that disconnects before the body starts.
+    """
+
+    def __init__(self, upstream: httpx.Response):
+        headers = {name: upstream.headers[name] for name in PASSTHROUGH_HEADERS if name in upstream.headers}
+        super().__init__(upstream.aiter_raw(), status_code=upstream.status_code, headers=headers)
+        self.upstream = upstream
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.upstream.aclose()
+
+async def passthrough_response(response: httpx.Response):
+    """Relay an open upstream response as-is."""
+    if response.headers.get("content-length") == "0":
+        await response.aclose()
+        # Keep the parsed mode's contract of answering empty bodies with {}
+        return MongoJSONResponse({}, status_code=response.status_code)
+    return PassthroughResponse(response)
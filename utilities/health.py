@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime, timezone
+from time import perf_counter
+from keys.keys import aiml_service_url
+from utilities.settings import get_logger
+from utilities.metrics import Gauge
+
+#! Initialize ---------------------------------------------------------------
+log = get_logger('health_log', 'debug/health.log')
+
+DEPENDENCIES = ("mongo", "aiml", "s3")
+
+dependency_up = Gauge(
+    "dependency_up",
+    "Whether the last health probe of a dependency succeeded (1) or not (0).",
+    ("dependency",),
+    preregister=[(name,) for name in DEPENDENCIES],
+    multiprocess_mode="min")
+
+dependency_probe_latency = Gauge(
+    "dependency_probe_latency_seconds",
+    "Latency of the last health probe of a dependency.",
+    ("dependency",),
+    preregister=[(name,) for name in DEPENDENCIES],
+    multiprocess_mode="max")
+
+#! Probes ---------------------------------------------------------------------
+def ping_mongo():
+    from database.mongo import get_client
+    get_client().admin.command('ping')
+
+def head_s3_bucket():
+    from utilities.s3_loader import get_s3_client, default_bucket_name
+    get_s3_client().head_bucket(Bucket=default_bucket_name)
+
+async def probe_mongo():
+    await asyncio.to_thread(ping_mongo)
+
+async def probe_aiml():
+    from utilities.forward import get_http_client
+    response = await get_http_client().get(f"{aiml_service_url}/status")
+    response.raise_for_status()
+
+async def probe_s3():
+    await asyncio.to_thread(head_s3_bucket)
+
+PROBES = {"mongo": probe_mongo, "aiml": probe_aiml, "s3": probe_s3}
+
+#! Health prober ----------------------------------------------------------------
+class HealthProber:
+    """
+    Probes Mongo, AIML and S3 in the background and caches the results, so
+    health endpoints answer from memory and load balancer polling never
+    touches a dependency or the request path.
+    """
+
+    def __init__(self, interval_s=10, timeout_s=5, required=("mongo", "aiml")):
+        self.interval = interval_s
+        self.timeout = timeout_s
+        self.required = tuple(required)
+        self.state = {name: {"status": "unknown", "latency_ms": None, "checked_at": None, "error": None}
+                      for name in DEPENDENCIES}
+        self._checked_at = None
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def is_fresh(self):
+        """Whether the cached state is recent enough to be trusted."""
+        return self._checked_at is not None and perf_counter() - self._checked_at <= 3 * self.interval + self.timeout
+
+    def is_ready(self):
+        return self.is_fresh() and all(self.state[name]["status"] == "up" for name in self.required)
+
+    def status_of(self, name):
+        return self.state[name]["status"] if self.is_fresh() else "unknown"
+
+    async def _probe(self, name):
+        start = perf_counter()
+        try:
+            await asyncio.wait_for(PROBES[name](), self.timeout)
+            status, error = "up", None
+        except Exception as e:
+            status, error = "down", str(e) or type(e).__name__
+        latency = perf_counter() - start
+        previous = self.state[name]["status"]
+        if status != previous and previous != "unknown":
+            (log.success if status == "up" else log.error)(f"{name} is {status}" + (f": {error}" if error else ""))
+        self.state[name] = {
+            "status": status,
+            "latency_ms": round(latency * 1000, 1),
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+            "error": error
+        }
+        dependency_up.labels(name).set(1 if status == "up" else 0)
+        dependency_probe_latency.labels(name).set(latency)
+
+    async def _run(self):
+        while True:
+            await asyncio.gather(*(self._probe(name) for name in DEPENDENCIES))
+            self._checked_at = perf_counter()
+            await asyncio.sleep(self.interval)
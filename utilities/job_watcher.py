@@ -0,0 +1,138 @@
+import asyncio
+from bson import ObjectId
+from keys.keys import aiml_service_url
+from database.mongo import get_client
+from utilities.forward import forward_request
+from utilities.settings import config, get_logger
+from utilities.metrics import Counter, Gauge
+
+#! Initialize ---------------------------------------------------------------
+log = get_logger('job_watcher_log', 'debug/job_watcher.log')
+
+watched_jobs = Gauge(
+    "job_watcher_jobs",
+    "File processing jobs with at least one subscriber in this worker.")
+
+job_polls = Counter(
+    "job_watcher_polls_total",
+    "Batched job status reads made by the job watcher, by source.",
+    ("source",),
+    preregister=[("mongo",), ("aiml",)])
+
+_UNREAD = object()
+
+def job_collection():
+    return get_client().jobs.files
+
+#! Job watcher ----------------------------------------------------------------
+class JobWatcher:
+    """
+    One poller per process for file processing jobs. Every `interval_s` it
+    reads the state of all watched jobs in one batch (a single `$in` query on
+    `jobs.files`, or bounded concurrent AIML reads when `source` is "aiml")
+    and pushes changed jobs to every subscriber's queue. Load follows the
+    number of watched jobs, not the number of clients or their poll rate.
+    """
+
+    def __init__(self, source="mongo", interval_s=1, terminal_statuses=("completed", "failed"), concurrency=8):
+        self.source = source
+        self.interval = interval_s
+        self.terminal_statuses = set(terminal_statuses)
+        self.concurrency = concurrency
+        self.subscribers = {}
+        self.latest = {}
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def is_terminal(self, job):
+        return job.get("status") in self.terminal_statuses
+
+    def subscribe(self, job_id):
+        """Queue receiving the job's state now and on every change. A job that cannot be found arrives as status "not_found"."""
+        queue = asyncio.Queue()
+        self.subscribers.setdefault(job_id, set()).add(queue)
+        watched_jobs.set(len(self.subscribers))
+        if job_id in self.latest:
+            queue.put_nowait(self.latest[job_id])
+        else:
+            self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, job_id, queue):
+        queues = self.subscribers.get(job_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[job_id]
+            self.latest.pop(job_id, None)
+        watched_jobs.set(len(self.subscribers))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        # Runs while anyone is subscribed; the next subscribe starts it again
+        while self.subscribers:
+            try:
+                jobs = await self.fetch(list(self.subscribers))
+                self.publish(jobs)
+            except Exception as e:
+                log.error(f"Polling {len(self.subscribers)} jobs failed: {e}")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def publish(self, jobs):
+        for job_id in list(self.subscribers):
+            if job_id not in jobs:
+                continue
+            job = jobs[job_id] or {"_id": job_id, "status": "not_found"}
+            if self.latest.get(job_id) == job:
+                continue
+            self.latest[job_id] = job
+            for queue in self.subscribers[job_id]:
+                queue.put_nowait(job)
+
+    async def fetch(self, job_ids):
+        """job_id -> job document, or None for jobs that do not exist. Jobs that could not be read are left out."""
+        job_polls.labels(self.source).inc()
+        if self.source == "aiml":
+            return await self._fetch_aiml(job_ids)
+        object_ids = [ObjectId(job_id) for job_id in job_ids if ObjectId.is_valid(job_id)]
+        documents = await asyncio.to_thread(lambda: list(job_collection().find({"_id": {"$in": object_ids}})))
+        found = {str(document["_id"]): document for document in documents}
+        return {job_id: found.get(job_id) for job_id in job_ids}
+
+    async def _fetch_aiml(self, job_ids):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_one(job_id):
+            async with semaphore:
+                try:
+                    payload = await forward_request('get', f"{aiml_service_url}/files/jobs/get/{job_id}")
+                except Exception as e:
+                    if getattr(e, "status_code", None) == 404:
+                        return job_id, None
+                    log.warning(f"Reading job {job_id} from AIML failed: {e}")
+                    return job_id, _UNREAD
+                return job_id, payload.get("data", payload)
+
+        results = await asyncio.gather(*(fetch_one(job_id) for job_id in job_ids))
+        return {job_id: job for job_id, job in results if job is not _UNREAD}
+
+job_watcher = JobWatcher(
+    source=config.get("job_watch.source", "mongo"),
+    interval_s=config.get("job_watch.interval_s", 1),
+    terminal_statuses=config.get("job_watch.terminal_statuses", ["completed", "failed"]),
+    concurrency=config.get("job_watch.concurrency", 8)
+)
@@ -1,8 +1,22 @@
-import json
+import orjson
 from bson import ObjectId
+from fastapi.responses import JSONResponse
 
-class MongoJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        return super().default(obj)
+def default(obj):
+    """orjson fallback for types it does not serialize natively (datetime is native)."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj) -> bytes:
+    return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+
+loads = orjson.loads
+
+class MongoJSONResponse(JSONResponse):
+    """
+    Default response class: orjson with ObjectId support. Returning an
+    instance directly from a route also skips FastAPI's jsonable_encoder pass.
+    """
+    def render(self, content) -> bytes:
+        return dumps(content)
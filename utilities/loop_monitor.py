@@ -0,0 +1,115 @@
+import asyncio
+import sys
+import threading
+import traceback
+import weakref
+from collections import deque
+from time import perf_counter, sleep
+from utilities.settings import config, get_logger
+from utilities.metrics import Counter, Gauge, Histogram
+
+#! Initialize ---------------------------------------------------------------
+log = get_logger('loop_monitor_log', 'debug/loop_monitor.log')
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+loop_lag = Histogram(
+    "event_loop_lag_seconds",
+    "Delay between when the lag sampler should have woken up and when it did.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+
+loop_lag_quantiles = Gauge(
+    "event_loop_lag_quantile_seconds",
+    "Event loop lag quantiles over the recent sampling window.",
+    ("quantile",),
+    preregister=[(str(q),) for q in QUANTILES],
+    multiprocess_mode="max")
+
+loop_blocked = Counter(
+    "event_loop_blocked_total",
+    "Callbacks that held the event loop longer than the block threshold, by route.",
+    ("route",))
+
+#! Loop monitor ---------------------------------------------------------------
+class LoopMonitor:
+    """
+    Samples event loop lag with a periodic sleep. In debug mode a watchdog
+    thread also catches the loop while it is stalled and logs the stack and
+    route of whatever is holding it.
+    """
+
+    def __init__(self, interval_ms=100, window=600, debug=False, block_threshold_ms=100):
+        self.interval = interval_ms / 1000
+        self.samples = deque(maxlen=window)
+        self.debug = debug
+        self.block_threshold = block_threshold_ms / 1000
+        self.task_scopes = weakref.WeakKeyDictionary()
+        self._heartbeat = perf_counter()
+        self._task = None
+        self._loop = None
+        self._loop_thread_id = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = perf_counter()
+        self._task = asyncio.create_task(self._sample())
+        if self.debug:
+            threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True).start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def percentiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+    async def _sample(self):
+        while True:
+            start = perf_counter()
+            await asyncio.sleep(self.interval)
+            self._heartbeat = perf_counter()
+            lag = max(0.0, self._heartbeat - start - self.interval)
+            loop_lag.observe(lag)
+            self.samples.append(lag)
+            for quantile, value in self.percentiles().items():
+                loop_lag_quantiles.labels(str(quantile)).set(value)
+
+    #* Debug mode ---------------------------------------------------------------
+    def track_request(self, scope):
+        """Associate the current task with its ASGI scope so stalls can be attributed to a route."""
+        task = asyncio.current_task()
+        if task is not None:
+            self.task_scopes[task] = scope
+
+    def _current_route(self):
+        task = asyncio.current_task(self._loop)
+        scope = self.task_scopes.get(task) if task is not None else None
+        if scope is None:
+            return "<background>"
+        route = scope.get("route")
+        return route.path if route is not None else scope.get("path", "<unknown>")
+
+    def _watchdog(self):
+        reported = None
+        while not self._stop.is_set():
+            sleep(self.block_threshold / 2)
+            heartbeat = self._heartbeat
+            stalled_for = perf_counter() - heartbeat - self.interval
+            if stalled_for < self.block_threshold or reported == heartbeat:
+                continue
+            reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame, limit=15)) if frame else "<no frame>"
+            route = self._current_route()
+            loop_blocked.labels(route).inc()
+            log.warning(f"Event loop blocked for {stalled_for * 1000:.0f}ms+ in route {route}\n{stack}")
@@ -0,0 +1,372 @@
+import asyncio
+import json
+import os
+import re
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+from pymongo import monitoring
+from utilities.settings import get_logger
+
+#! Initialize ---------------------------------------------------------------
+log = get_logger('metrics_log', 'debug/metrics.log')
+
+#! Metric primitives ---------------------------------------------------------
+# Small Prometheus-compatible collectors. Children are created once per label
+# set and cached, so the hot path is a dict lookup plus a few float additions.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), preregister=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        for values in preregister:
+            self.labels(*values)
+        if not self.labelnames:
+            self._default = self.labels()
+        _registry.append(self)
+
+    def labels(self, *values):
+        """Return the child for a label set, creating it on first use."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self, children=None):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list((self._children if children is None else children).items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+    def snapshot(self):
+        return [[list(values), child.snapshot()] for values, child in list(self._children.items())]
+
+    def merge(self, snapshots):
+        """Children summing every worker's snapshot of this metric, given (alive, snapshot) pairs."""
+        children = {}
+        for _, snapshot in snapshots:
+            for values, value in snapshot:
+                child = children.setdefault(tuple(values), self._new_child())
+                child.absorb(value)
+        return children
+
+class _ValueChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = float(value)
+
+    def snapshot(self):
+        return self.value
+
+    def absorb(self, value):
+        self.value += value
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {self.value}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _ValueChild()
+
+    def inc(self, amount=1.0):
+        self._default.inc(amount)
+
+class Gauge(_Metric):
+    """
+    In multiprocess mode the values of live workers are combined by
+    `multiprocess_mode`: "sum" for per-worker shares (open streams), "max" or
+    "min" for per-worker copies of the same quantity (index size, probes).
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), preregister=(), multiprocess_mode="sum"):
+        if multiprocess_mode not in ("sum", "max", "min"):
+            raise ValueError(f"Unknown multiprocess mode '{multiprocess_mode}'")
+        self.multiprocess_mode = multiprocess_mode
+        super().__init__(name, documentation, labelnames, preregister)
+
+    def _new_child(self):
+        return _ValueChild()
+
+    def merge(self, snapshots):
+        # Gauges of workers that exited no longer describe anything
+        combine = {"sum": sum, "max": max, "min": min}[self.multiprocess_mode]
+        grouped = {}
+        for alive, snapshot in snapshots:
+            if not alive:
+                continue
+            for values, value in snapshot:
+                grouped.setdefault(tuple(values), []).append(value)
+        children = {}
+        for values, group in grouped.items():
+            child = children[values] = self._new_child()
+            child.set(combine(group))
+        return children
+
+    def inc(self, amount=1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount=1.0):
+        self._default.dec(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        return {"counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+    def absorb(self, snapshot):
+        self.counts = [a + b for a, b in zip(self.counts, snapshot["counts"])]
+        self.sum += snapshot["sum"]
+        self.count += snapshot["count"]
+
+    def render(self, name, labelnames, values):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            le = 'le="%s"' % bound
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {self.count}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {self.sum}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {self.count}")
+        return lines
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, preregister=()):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, preregister)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+def render_metrics():
+    """
+    Render every registered metric in the Prometheus text exposition format.
+    In multiprocess mode the values are those of all workers combined.
+    """
+    lines = []
+    if multiprocess_dir():
+        write_snapshot()
+        snapshots = read_snapshots()
+        for metric in _registry:
+            lines.extend(metric.render(metric.merge([(alive, snapshot.get(metric.name, [])) for alive, snapshot in snapshots])))
+    else:
+        for metric in _registry:
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+#! Multiprocess mode -----------------------------------------------------------
+# Every uvicorn worker has its own registry, so a scrape of the shared port
+# would only see whichever worker answered it. When _serve.py runs several
+# workers it points them at a shared directory: each writes its registry to
+# <pid>.json there every few seconds, and /metrics merges all the files.
+# Counters and histograms of workers that exited stay in the sum, so totals
+# never go backwards; their gauges are dropped.
+
+MULTIPROCESS_DIR_ENV = "METRICS_MULTIPROC_DIR"
+
+def multiprocess_dir():
+    return os.environ.get(MULTIPROCESS_DIR_ENV)
+
+def write_snapshot():
+    """Write this worker's registry to its snapshot file, atomically."""
+    path = os.path.join(multiprocess_dir(), f"{os.getpid()}.json")
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as file:
+        json.dump({metric.name: metric.snapshot() for metric in _registry}, file)
+    os.replace(temporary, path)
+
+def _alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def read_snapshots():
+    """(alive, snapshot) for every worker that has written one."""
+    directory = multiprocess_dir()
+    snapshots = []
+    for name in os.listdir(directory):
+        pid, extension = os.path.splitext(name)
+        if extension != ".json" or not pid.isdigit():
+            continue
+        try:
+            with open(os.path.join(directory, name)) as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            continue
+        snapshots.append((_alive(int(pid)), snapshot))
+    return snapshots
+
+class SnapshotWriter:
+    """Writes this worker's snapshot every `interval_s` and once more on stop."""
+
+    def __init__(self, interval_s=5):
+        self.interval = interval_s
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await asyncio.to_thread(write_snapshot)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(write_snapshot)
+            except Exception as e:
+                log.error(f"Writing the metrics snapshot failed: {e}")
+            await asyncio.sleep(self.interval)
+
+#! Application metrics -------------------------------------------------------
+request_duration = Histogram(
+    "api_request_duration_seconds",
+    "Time spent handling HTTP requests, by route template.",
+    ("method", "route", "status"))
+
+aiml_request_duration = Histogram(
+    "aiml_request_duration_seconds",
+    "Latency of forwarded requests to the AIML service, per attempt.",
+    ("method", "path", "status"))
+
+mongo_operation_duration = Histogram(
+    "mongo_operation_duration_seconds",
+    "Latency of MongoDB commands.",
+    ("command", "status"),
+    preregister=[(command, status)
+                 for command in ("ping", "find", "insert", "update", "delete", "listDatabases", "listCollections")
+                 for status in ("ok", "error")])
+
+s3_operation_duration = Histogram(
+    "s3_operation_duration_seconds",
+    "Latency of S3 operations, including client construction and presigning.",
+    ("operation", "status"),
+    preregister=[(operation, status)
+                 for operation in ("download", "upload", "list", "presign_get", "presign_put", "head", "delete", "delete_batch")
+                 for status in ("ok", "error")])
+
+sse_active_streams = Gauge(
+    "sse_active_streams",
+    "Chat and job event streams currently open.",
+    ("kind",),
+    preregister=[("agent",), ("team",), ("job",)])
+
+sse_streamed_bytes = Counter(
+    "sse_streamed_bytes_total",
+    "Bytes relayed to clients over chat event streams.",
+    ("kind",),
+    preregister=[("agent",), ("team",)])
+
+#* Helpers --------------------------------------------------------------------
+@contextmanager
+def track(histogram, *labels):
+    """Time the enclosed block into `histogram`, appending an ok/error status label."""
+    start = perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        histogram.labels(*labels, status).observe(perf_counter() - start)
+
+_ID_SEGMENT = re.compile(r"^([0-9a-fA-F]{24}|\d+|user_[A-Za-z0-9]+|[0-9a-fA-F-]{36})$")
+
+def normalize_path(path):
+    """Collapse id-like path segments so upstream paths stay low-cardinality labels."""
+    return "/".join(":id" if _ID_SEGMENT.match(segment) else segment for segment in path.split("/"))
+
+def preregister_routes(routes):
+    """Create request histogram children for every route up front."""
+    for route in routes:
+        for method in getattr(route, "methods", None) or ():
+            request_duration.labels(method, route.path, "200")
+
+class MongoMetricsListener(monitoring.CommandListener):
+    """pymongo command listener feeding `mongo_operation_duration`."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_operation_duration.labels(event.command_name, "ok").observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        mongo_operation_duration.labels(event.command_name, "error").observe(event.duration_micros / 1e6)
@@ -0,0 +1,148 @@
+import asyncio
+import base64
+import binascii
+from fastapi import HTTPException, Query, Request
+from utilities.forward import forward_request
+from utilities.json_encoder import dumps, loads, MongoJSONResponse
+
+#! Cursor pagination ----------------------------------------------------------
+# Cursors are opaque to clients: base64url-encoded JSON holding the keyset
+# position (created_at, _id) of the page boundary, the direction to read in
+# and the offset of the next page. Upstream receives the position as before_/
+# after_ created_at and id params with skip=0, so each page is an index seek
+# instead of a growing skip. An upstream that ignores those params is detected
+# and paged by the offset instead.
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(dumps(position)).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        position = loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(position, dict) or position.get("direction") not in ("before", "after") or "_id" not in position:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(position.get("skip", 0), int) or not isinstance(position.get("keyset", True), bool):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return position
+
+def cursor_query(request: Request, cursor: str = Query(None, description="Opaque cursor from a previous next_cursor. Pass an empty value to start cursor pagination; omit for limit/skip paging.")):
+    """Dependency: None for limit/skip mode, {} for the first cursor page, else the decoded position."""
+    if cursor is None:
+        return None
+    # The keyset is (created_at, _id), so cursors only follow that order
+    if request.query_params.get("sort_by", "created_at") != "created_at":
+        raise HTTPException(status_code=400, detail="Cursor pagination only supports sort_by=created_at")
+    if cursor == "":
+        return {}
+    return decode_cursor(cursor)
+
+def page_items(payload):
+    """The list of items in an AIML page: `data` for listings, `data.history` for histories."""
+    data = payload.get("data") if isinstance(payload, dict) else None
+    if isinstance(data, dict):
+        data = data.get("history")
+    return data if isinstance(data, list) else None
+
+def _key(item):
+    return (str(item.get("created_at") or ""), str(item.get("_id") or ""))
+
+def _beyond(item, boundary, direction):
+    return _key(item) < boundary if direction == "before" else _key(item) > boundary
+
+async def read_page(method, url, position, direction, user_id=None, params=None, **kwargs):
+    """
+    Read the page after `position` and return (payload, items, next_position);
+    next_position is None on the last page. Pages by keyset while the upstream
+    honours the before_/after_ params, and by the offset in the position once
+    it is seen to ignore them.
+    """
+    params = dict(params or {})
+    limit = params.get("limit", 20)
+    offset = position.get("skip", 0)
+    keyset = position.get("keyset", True)
+    boundary = (str(position.get("created_at") or ""), str(position["_id"])) if position else None
+
+    async def fetch(by_keyset):
+        page_params = {**params, "skip": 0 if by_keyset else offset}
+        if position and by_keyset:
+            page_params[f"{direction}_created_at"] = position.get("created_at")
+            page_params[f"{direction}_id"] = position["_id"]
+        payload = await forward_request(method, url, user_id=user_id, params=page_params, **kwargs)
+        return payload, page_items(payload)
+
+    payload, items = await fetch(keyset)
+    if position and keyset and items and not all(_beyond(item, boundary, direction) for item in items):
+        # The upstream ignored the keyset params: page by offset from here on
+        keyset = False
+        payload, items = await fetch(False)
+    if items is None:
+        return payload, None, None
+
+    received = len(items)
+    if position and not keyset:
+        # Drop items already sent that were pushed down by newer ones. A full
+        # page of them means at least `limit` items were added above the
+        # boundary, so read on from the next offset
+        kept = [item for item in items if _beyond(item, boundary, direction)]
+        while received >= limit and not kept:
+            previous = [_key(item) for item in items]
+            offset += received
+            payload, items = await fetch(False)
+            if items is None:
+                return payload, None, None
+            if [_key(item) for item in items] == previous:
+                raise HTTPException(status_code=502, detail="Upstream ignored the pagination parameters")
+            received = len(items)
+            kept = [item for item in items if _beyond(item, boundary, direction)]
+        items[:] = kept
+
+    next_position = None
+    if items and received >= limit:
+        edge = min(items, key=_key) if direction == "before" else max(items, key=_key)
+        next_position = {
+            "created_at": edge.get("created_at"),
+            "_id": edge.get("_id"),
+            "direction": direction,
+            "skip": offset + received,
+            "keyset": keyset
+        }
+    return payload, items, next_position
+
+async def forward_cursor_page(method, url, position, sort_order=-1, user_id=None, params=None, **kwargs):
+    """
+    Forward a page request in cursor mode and add `next_cursor` to the response.
+    Descending listings (and histories) read "before" the boundary, ascending ones "after".
+    """
+    direction = position.get("direction") or ("after" if sort_order == 1 else "before")
+    payload, _, next_position = await read_page(method, url, position, direction, user_id=user_id, params=params, **kwargs)
+    payload["next_cursor"] = encode_cursor(next_position) if next_position else None
+    return MongoJSONResponse(payload)
+
+
+#! Full iteration ---------------------------------------------------------------
+async def iterate_pages(method, url, page_size=100, user_id=None, params=None, **kwargs):
+    """
+    Yield every page of a newest-first listing or history as a list of items,
+    reading pages as cursor mode does (keyset, or offset when the upstream
+    ignores it). An upstream that stops paging raises instead of ending early.
+    The next page is requested while the caller handles the current one, so
+    at most two are held.
+    """
+    params = {**(params or {}), "limit": page_size}
+
+    async def fetch(position):
+        _, items, next_position = await read_page(method, url, position, "before", user_id=user_id, params=params, **kwargs)
+        return items or [], next_position
+
+    pending = asyncio.ensure_future(fetch({}))
+    try:
+        while pending is not None:
+            items, next_position = await pending
+            pending = asyncio.ensure_future(fetch(next_position)) if next_position else None
+            if items:
+                yield items
+    finally:
+        if pending is not None:
+            pending.cancel()
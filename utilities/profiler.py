@@ -0,0 +1,70 @@
+import asyncio
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from time import sleep
+
+PROFILE_DIR = "debug/profiles"
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+class RequestProfiler:
+    """
+    Samples the event loop thread's stack while a single request's task is
+    running on it and aggregates the samples as folded stacks, the input format
+    of flamegraph.pl, speedscope and inferno.
+    """
+
+    def __init__(self, interval_ms=5):
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, args=(loop, task, thread_id), name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self):
+        if self._thread:
+            self._thread.join()
+
+    def _run(self, loop, task, thread_id):
+        while not self._stop.is_set():
+            sleep(self.interval)
+            # Skip samples where the loop is idle or busy with another request
+            if asyncio.current_task(loop) is not task:
+                continue
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+def write_profile(route, profiler, directory=PROFILE_DIR):
+    """Write a profile as a folded-stacks file tagged with the route name. Returns the file path."""
+    os.makedirs(directory, exist_ok=True)
+    route_tag = re.sub(r"[^A-Za-z0-9_-]+", "_", route).strip("_") or "root"
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    path = os.path.join(directory, f"{route_tag}_{timestamp}.folded")
+    with open(path, "w") as file:
+        file.write(profiler.folded())
+    return path
@@ -1,23 +1,18 @@
-import boto3
 import os
 import time
 import uuid
 import glob
-import psutil
-import time
+import threading
 from functools import wraps
-from ultraconfiguration import UltraConfig
-from ultraprint.logging import logger
-from keys.keys import aws_access_key_id, aws_secret , environment
+from utilities.settings import config, get_logger
+from keys.keys import aws_access_key_id, aws_secret
 import mimetypes
+from utilities.metrics import s3_operation_duration, track
+from utilities.timing import span
+from contextlib import contextmanager
 
 #! Initialize ---------------------------------------------------------------
-config = UltraConfig('config.json')
-log = logger('s3_loader_log', 
-            filename='debug/s3_loader.log', 
-            include_extra_info=config.get("logging.include_extra_info", False), 
-            write_to_file=config.get("logging.write_to_file", False), 
-            log_level=config.get("logging.development_level", "DEBUG") if environment == 'development' else config.get("logging.production_level", "INFO"))
+log = get_logger('s3_loader_log', 'debug/s3_loader.log')
 
 # essential variables
 temp_dir = config.get("caching.dir", "cache")
@@ -27,6 +22,32 @@ default_bucket_name = config.get("aws.default_bucket_name", "infinite-v2-data")
 # Ensure Temp directory exists
 os.makedirs(temp_dir, exist_ok=True)
 
+# boto3 is imported and the client built on first use; clients are thread-safe,
+# so one is shared instead of paying for a session and client on every call
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+def get_s3_client():
+    """Return the shared S3 client, creating it on first use."""
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                import boto3
+                session = boto3.Session(
+                    aws_access_key_id=aws_access_key_id,
+                    aws_secret_access_key=aws_secret,
+                    region_name=aws_region
+                )
+                _s3_client = session.client("s3", region_name=aws_region)
+    return _s3_client
+
+@contextmanager
+def observe_s3(operation):
+    """Record an S3 operation in the latency metrics and the request's timing spans"""
+    with track(s3_operation_duration, operation), span("s3", operation):
+        yield
+
 def generate_unique_filename(original_filename):
     """Generate a unique filename while preserving the original name"""
     name, extension = os.path.splitext(original_filename)
@@ -60,6 +81,7 @@ def retry_on_file_access_error(max_attempts=3, delay=1):
 
 def force_close_file_handles(file_path):
     """Force close any open handles to the specified file"""
+    import psutil
     try:
         for proc in psutil.process_iter():
             try:
@@ -113,13 +135,9 @@ def download_from_s3(key, unique_filename=False, bucket_name=default_bucket_name
         name = key.split("/")[-1]
         
     local_path = os.path.join(temp_dir, name)
-    session = boto3.Session( 
-        aws_access_key_id=aws_access_key_id, 
-        aws_secret_access_key=aws_secret, 
-        region_name=aws_region 
-        )
-    s3 = session.client("s3", region_name=aws_region)
-    s3.download_file(bucket_name, key, local_path)
+    with observe_s3("download"):
+        s3 = get_s3_client()
+        s3.download_file(bucket_name, key, local_path)
     log.success(f"Downloaded {key} from S3 bucket {bucket_name} to {local_path}")
     return local_path
 
@@ -131,13 +149,9 @@ def upload_to_s3(key, local_path, bucket_name=default_bucket_name):
     if not os.path.exists(local_path):
         raise FileNotFoundError(f"Local file {local_path} not found")
     
-    session = boto3.Session( 
-        aws_access_key_id=aws_access_key_id, 
-        aws_secret_access_key=aws_secret, 
-        region_name=aws_region 
-        )
-    s3 = session.client("s3", region_name=aws_region)
-    s3.upload_file(local_path, bucket_name, key)
+    with observe_s3("upload"):
+        s3 = get_s3_client()
+        s3.upload_file(local_path, bucket_name, key)
     log.success(f"Uploaded {local_path} to S3 bucket {bucket_name} as {key}")
     
     return key
@@ -148,13 +162,9 @@ def list_files_in_s3_directory(directory, only_files=True, recursive=False, buck
     If only_files is True, ignore any subdirectories.
     If recursive is False, do not go into subdirectories.
     """
-    session = boto3.Session( 
-        aws_access_key_id=aws_access_key_id, 
-        aws_secret_access_key=aws_secret, 
-        region_name=aws_region 
-        )
-    s3 = session.client("s3", region_name=aws_region)
-    response = s3.list_objects_v2(Bucket=bucket_name, Prefix=directory)
+    with observe_s3("list"):
+        s3 = get_s3_client()
+        response = s3.list_objects_v2(Bucket=bucket_name, Prefix=directory)
     
     if 'Contents' not in response:
         return []
@@ -185,22 +195,17 @@ def generate_download_link(key, expiration=3600, bucket_name=default_bucket_name
     Returns:
         str: A pre-signed URL that can be used to download the object
     """
-    session = boto3.Session( 
-        aws_access_key_id=aws_access_key_id, 
-        aws_secret_access_key=aws_secret, 
-        region_name=aws_region 
-    )
-    s3 = session.client("s3", region_name=aws_region)
-    
     try:
-        url = s3.generate_presigned_url(
-            'get_object',
-            Params={
-                'Bucket': bucket_name,
-                'Key': key
-            },
-            ExpiresIn=expiration
-        )
+        with observe_s3("presign_get"):
+            s3 = get_s3_client()
+            url = s3.generate_presigned_url(
+                'get_object',
+                Params={
+                    'Bucket': bucket_name,
+                    'Key': key
+                },
+                ExpiresIn=expiration
+            )
         log.success(f"Generated temporary download link for {key} (expires in {expiration} seconds)")
         return url
     except Exception as e:
@@ -221,23 +226,19 @@ def generate_upload_url(file_name: str, key: str, bucket_name=default_bucket_nam
         dict: Contains presigned URL and related metadata
     """
     try:
-        session = boto3.Session(
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret,
-            region_name=aws_region
-        )
-        s3_client = session.client('s3')
-        
-        content_type = mimetypes.guess_type(file_name)[0]
-        presigned_url = s3_client.generate_presigned_url(
-            'put_object',
-            Params={
-                'Bucket': bucket_name,
-                'Key': key,
-                'ContentType': content_type
-            },
-            ExpiresIn=expiration
-        )
+        with observe_s3("presign_put"):
+            s3_client = get_s3_client()
+            
+            content_type = mimetypes.guess_type(file_name)[0]
+            presigned_url = s3_client.generate_presigned_url(
+                'put_object',
+                Params={
+                    'Bucket': bucket_name,
+                    'Key': key,
+                    'ContentType': content_type
+                },
+                ExpiresIn=expiration
+            )
         
         log.success(f"Generated upload URL for {key} (expires in {expiration} seconds)")
         return {
@@ -249,3 +250,52 @@ def generate_upload_url(file_name: str, key: str, bucket_name=default_bucket_nam
     except Exception as e:
         log.error(f"Error generating upload URL: {str(e)}")
         raise
+
+def object_exists(key, bucket_name=default_bucket_name):
+    """
+    Checks whether an object exists with a HEAD request. Errors other than
+    not found are raised.
+    """
+    from botocore.exceptions import ClientError
+    with observe_s3("head"):
+        try:
+            get_s3_client().head_object(Bucket=bucket_name, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+def delete_from_s3(key, bucket_name=default_bucket_name):
+    """
+    Deletes a single object from S3.
+    """
+    with observe_s3("delete"):
+        s3 = get_s3_client()
+        s3.delete_object(Bucket=bucket_name, Key=key)
+    log.success(f"Deleted {key} from S3 bucket {bucket_name}")
+
+S3_DELETE_BATCH_SIZE = 1000  # DeleteObjects limit per request
+
+def delete_many_from_s3(keys, bucket_name=default_bucket_name):
+    """
+    Deletes objects from S3 with DeleteObjects, up to 1,000 keys per request.
+    Returns a dict of key -> error message for the keys that failed.
+    """
+    failed = {}
+    s3 = get_s3_client()
+    for start in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+        batch = keys[start:start + S3_DELETE_BATCH_SIZE]
+        try:
+            with observe_s3("delete_batch"):
+                response = s3.delete_objects(
+                    Bucket=bucket_name,
+                    Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
+                )
+        except Exception as e:
+            failed.update({key: str(e) for key in batch})
+            continue
+        for error in response.get("Errors", []):
+            failed[error.get("Key")] = error.get("Message") or error.get("Code", "Unknown error")
+    log.success(f"Deleted {len(keys) - len(failed)} of {len(keys)} objects from S3 bucket {bucket_name}")
+    return failed
@@ -0,0 +1,15 @@
+from ultraconfiguration import UltraConfig
+from ultraprint.logging import logger
+from keys.keys import environment
+
+#! Shared settings -----------------------------------------------------------
+# config.json is parsed once per process and shared by every module.
+config = UltraConfig('config.json')
+
+def get_logger(name, filename):
+    """Build a logger with the project's standard output and level settings."""
+    return logger(name, 
+                filename=filename, 
+                include_extra_info=config.get("logging.include_extra_info", False), 
+                write_to_file=config.get("logging.write_to_file", False), 
+                log_level=config.get("logging.development_level", "DEBUG") if environment == 'development' else config.get("logging.production_level", "INFO"))
@@ -0,0 +1,53 @@
+import asyncio
+from time import perf_counter
+# Phases are measured from this module's import, which _server.py does first
+_last_mark = perf_counter()
+_phases = []
+
+from utilities.settings import get_logger
+from utilities.metrics import Gauge
+
+#! Initialize ---------------------------------------------------------------
+log = get_logger('startup_log', 'debug/startup.log')
+
+startup_phase_duration = Gauge(
+    "startup_phase_seconds",
+    "Time spent in each application startup phase.",
+    ("phase",),
+    multiprocess_mode="max")
+
+def mark_phase(name):
+    """Close the current startup phase under `name` and start the next one."""
+    global _last_mark
+    now = perf_counter()
+    _phases.append((name, now - _last_mark))
+    _last_mark = now
+
+def report_startup():
+    """Log how long each startup phase took and export the durations as metrics."""
+    total = sum(seconds for _, seconds in _phases)
+    for name, seconds in _phases:
+        startup_phase_duration.labels(name).set(seconds)
+    startup_phase_duration.labels("total").set(total)
+    breakdown = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in _phases)
+    log.info(f"Startup finished in {total * 1000:.0f}ms ({breakdown})")
+
+async def warm_up():
+    """
+    Create this worker's shared clients and fetch the signing keys before it
+    takes traffic, so the first requests do not pay for them. Failures are only
+    logged; the resources are created lazily again on first use.
+    """
+    from database.mongo import get_client
+    from dependencies.auth import refresh_jwks
+    from utilities.forward import get_http_client
+    from utilities.s3_loader import get_s3_client
+
+    get_http_client()
+    for name, create in (("mongo", lambda: asyncio.to_thread(get_client)),
+                         ("s3", lambda: asyncio.to_thread(get_s3_client)),
+                         ("jwks", refresh_jwks)):
+        try:
+            await create()
+        except Exception as e:
+            log.warning(f"Warm-up of {name} failed, it will be retried on first use: {e}")
@@ -0,0 +1,219 @@
+import asyncio
+import os
+import random
+import socket
+from datetime import datetime, timezone, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+from database.mongo import get_client
+from utilities.settings import config, get_logger
+from utilities.metrics import Counter, Gauge
+
+#! Initialize ---------------------------------------------------------------
+log = get_logger('task_queue_log', 'debug/task_queue.log')
+
+tasks_finished = Counter(
+    "background_tasks_total",
+    "Background task attempts, by kind and outcome (done, retry, wait, failed).",
+    ("kind", "outcome"))
+
+tasks_running = Gauge(
+    "background_tasks_running",
+    "Background tasks currently running in this worker.")
+
+def task_collection():
+    return get_client().jobs.tasks
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+class TaskRetry(Exception):
+    """Raise from a handler to run the task again after `delay` seconds without using up an attempt."""
+
+    def __init__(self, delay, reason="Not ready yet"):
+        super().__init__(reason)
+        self.delay = delay
+
+class TaskFailed(Exception):
+    """Raise from a handler to fail the task without retrying."""
+
+#! Task queue ---------------------------------------------------------------
+class TaskQueue:
+    """
+    Background tasks persisted in Mongo (`jobs.tasks`). enqueue() stores a
+    task and returns straight away; every worker process claims due tasks
+    atomically, runs them with bounded concurrency and retries failures with
+    exponential backoff. A claim is a lease: a task whose worker died is
+    claimed again once `lease_s` has passed.
+    """
+
+    def __init__(self, concurrency=4, poll_interval_s=2, max_attempts=5, backoff_base_s=2, backoff_max_s=300, lease_s=300):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval_s
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base_s
+        self.backoff_max = backoff_max_s
+        self.lease = lease_s
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.handlers = {}
+        self._running = set()
+        self._deferred = set()
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def handler(self, kind):
+        """Register `async def fn(payload)` as the handler for tasks of `kind`."""
+        def register(fn):
+            self.handlers[kind] = fn
+            return fn
+        return register
+
+    async def enqueue(self, kind, payload, user_id=None, max_attempts=None):
+        """Persist a task and return it. It runs on whichever worker claims it first."""
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for task kind '{kind}'")
+        now = utcnow()
+        task = {
+            "_id": ObjectId(),
+            "kind": kind,
+            "payload": payload,
+            "user_id": user_id,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": max_attempts or self.max_attempts,
+            "run_at": now,
+            "created_at": now,
+            "updated_at": now,
+            "last_error": None,
+            "result": None
+        }
+        await asyncio.to_thread(task_collection().insert_one, task)
+        self._wake.set()
+        return task
+
+    async def get(self, task_id, user_id=None):
+        """A task without its payload, or None if it does not exist or belongs to someone else."""
+        query = {"_id": ObjectId(task_id)}
+        if user_id is not None:
+            query["user_id"] = user_id
+        return await asyncio.to_thread(task_collection().find_one, query, {"payload": 0, "worker": 0})
+
+    async def wake(self, task_id, user_id=None):
+        """Make a waiting task due now. Returns False if there is no such queued task."""
+        query = {"_id": ObjectId(task_id), "status": "queued"}
+        if user_id is not None:
+            query["user_id"] = user_id
+        result = await asyncio.to_thread(task_collection().update_one, query, {"$set": {"run_at": utcnow(), "updated_at": utcnow()}})
+        self._wake.set()
+        return result.matched_count > 0
+
+    def defer(self, fn, *args):
+        """
+        Run a blocking side effect in a thread without waiting for it. For
+        work that is not worth persisting (e.g. writing an error log entry);
+        runs inline when there is no event loop.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            fn(*args)
+            return
+        future = loop.run_in_executor(None, fn, *args)
+        self._deferred.add(future)
+        future.add_done_callback(self._deferred.discard)
+
+    #* Worker ---------------------------------------------------------------
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=10):
+        """Stop claiming, then give running tasks and deferred work `timeout` seconds to finish."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        pending = self._running | self._deferred
+        if pending:
+            # Anything cut off here is claimed again when its lease expires
+            await asyncio.wait(pending, timeout=timeout)
+
+    async def _run(self):
+        while True:
+            try:
+                while len(self._running) < self.concurrency:
+                    task = await asyncio.to_thread(self._claim)
+                    if task is None:
+                        break
+                    running = asyncio.create_task(self._execute(task))
+                    self._running.add(running)
+                    running.add_done_callback(self._running.discard)
+            except Exception as e:
+                log.error(f"Claiming background tasks failed: {e}")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _claim(self):
+        now = utcnow()
+        return task_collection().find_one_and_update(
+            {"status": {"$in": ["queued", "running"]}, "run_at": {"$lte": now}, "kind": {"$in": list(self.handlers)}},
+            {"$set": {"status": "running", "worker": self.worker_id, "run_at": now + timedelta(seconds=self.lease), "updated_at": now},
+             "$inc": {"attempts": 1}},
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _execute(self, task):
+        tasks_running.inc()
+        try:
+            if task["attempts"] > task["max_attempts"]:
+                raise RuntimeError("Gave up after the task's lease expired on its last attempt")
+            result = await asyncio.wait_for(self.handlers[task["kind"]](task["payload"]), self.lease)
+        except TaskRetry as e:
+            await asyncio.to_thread(self._settle, task, "wait", {
+                "status": "queued",
+                "attempts": task["attempts"] - 1,
+                "run_at": utcnow() + timedelta(seconds=e.delay),
+                "last_error": None,
+                "waiting_for": str(e)
+            })
+        except TaskFailed as e:
+            await asyncio.to_thread(self._settle, task, "failed", {"status": "failed", "finished_at": utcnow(), "last_error": str(e)})
+        except Exception as e:
+            await asyncio.to_thread(self._failed, task, e)
+        else:
+            await asyncio.to_thread(self._settle, task, "done", {"status": "done", "finished_at": utcnow(), "last_error": None, "waiting_for": None, "result": result})
+        finally:
+            tasks_running.dec()
+            self._wake.set()
+
+    def _failed(self, task, error):
+        if task["attempts"] >= task["max_attempts"]:
+            log.error(f"Task {task['_id']} ({task['kind']}) failed after {task['attempts']} attempts: {error}")
+            self._settle(task, "failed", {"status": "failed", "finished_at": utcnow(), "last_error": str(error)})
+            return
+        # Exponential backoff with jitter so retries of a shared failure spread out
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (task["attempts"] - 1)) * random.uniform(0.5, 1.0)
+        log.warning(f"Task {task['_id']} ({task['kind']}) attempt {task['attempts']} failed, retrying in {delay:.1f}s: {error}")
+        self._settle(task, "retry", {"status": "queued", "run_at": utcnow() + timedelta(seconds=delay), "last_error": str(error)})
+
+    def _settle(self, task, outcome, fields):
+        tasks_finished.labels(task["kind"], outcome).inc()
+        # Only the holder of this attempt's lease may record its outcome
+        task_collection().update_one(
+            {"_id": task["_id"], "worker": self.worker_id, "attempts": task["attempts"]},
+            {"$set": {**fields, "updated_at": utcnow()}}
+        )
+
+task_queue = TaskQueue(
+    concurrency=config.get("tasks.concurrency", 4),
+    poll_interval_s=config.get("tasks.poll_interval_s", 2),
+    max_attempts=config.get("tasks.max_attempts", 5),
+    backoff_base_s=config.get("tasks.backoff_base_s", 2),
+    backoff_max_s=config.get("tasks.backoff_max_s", 300),
+    lease_s=config.get("tasks.lease_s", 300)
+)
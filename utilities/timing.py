@@ -0,0 +1,42 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+#! Request spans --------------------------------------------------------------
+# Spans are collected in a per-request list held in a context variable. Outside
+# of a request (scripts, background work) `span` is a no-op.
+
+_request_spans = ContextVar("request_spans", default=None)
+
+def begin_request():
+    """Start collecting spans for the current request. Returns (token, spans)."""
+    spans = []
+    return _request_spans.set(spans), spans
+
+def end_request(token):
+    _request_spans.reset(token)
+
+@contextmanager
+def span(name, description=None):
+    """Record the duration of the enclosed block as a named span on the current request."""
+    spans = _request_spans.get()
+    if spans is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        spans.append((name, description, (perf_counter() - start) * 1000))
+
+def format_server_timing(spans, total_ms=None):
+    """Format spans as a Server-Timing header value."""
+    entries = []
+    for name, description, duration_ms in spans:
+        if description:
+            entries.append(f'{name};desc="{description}";dur={duration_ms:.1f}')
+        else:
+            entries.append(f"{name};dur={duration_ms:.1f}")
+    if total_ms is not None:
+        entries.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(entries)